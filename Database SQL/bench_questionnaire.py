@@ -0,0 +1,337 @@
+"""Benchmarks for the questionnaire pipeline on synthetic catalogs.
+
+``synthetic_catalog`` generates flat question rows (1k to 1M questions) with a
+configurable section count and question type mix; ``synthetic_responses``
+generates ``responses`` rows whose ``answers`` match such a catalog, with a
+share of blank and invalid answers. Each benchmark records wall time,
+throughput and peak traced memory, and results can be saved as a baseline and
+compared against later runs::
+
+    python bench_questionnaire.py --sizes 1000,100000 --save bench-baseline.json
+    python bench_questionnaire.py --sizes 1000,100000 --compare bench-baseline.json
+
+``--compare`` exits with status 1 when a benchmark is slower, or uses more
+memory, than its baseline by more than ``--tolerance``. A full run at 1M
+questions takes a few minutes and about 3.5 GB of memory, most of it for the
+in-memory ``serialize`` document::
+
+    python bench_questionnaire.py --sizes 1000000 --repeat 1
+"""
+import argparse
+import copy
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from pipeline_profile import StageProfiler
+from questionnaire_catalog import Catalog
+from questionnaire_stream import iter_sections, write_sections
+from response_analytics import ResponseColumns, summarize
+from response_validator import ResponseValidator, default_range
+from unit_normalization import UnitNormalizer
+
+DEFAULT_TYPE_MIX = "text=0.35,number=0.4,boolean=0.15,select=0.1"
+DEFAULT_TOLERANCE = 0.25
+SECTOR_OPTIONS = ["Manufacturing", "Retail", "Services", "Agriculture", "Construction"]
+# Target unit -> a convertible unit answers are entered in, for the normalize benchmark.
+UNITS = {"kWh": "MWh", "tonnes CO₂e": "kg CO2e", "kg": "t", "m3": "liters", "EUR": "k€", "hours": "minutes",
+         "%": "fraction"}
+
+
+def _load_script():
+    # new-questionaire.py is not importable by name because of the hyphen.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "new-questionaire.py")
+    spec = importlib.util.spec_from_file_location("new_questionaire", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_type_mix(text):
+    """Parse ``"text=0.4,number=0.6"`` into ``{"text": 0.4, "number": 0.6}``."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {"text", "number", "boolean", "select"}
+    if unknown:
+        raise ValueError(f"Unknown question types in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def synthetic_catalog(n_questions, n_sections=10, type_mix=DEFAULT_TYPE_MIX, required=10, seed=0):
+    """Return ``(flat_questions, unit_mapping)`` for a synthetic catalog.
+
+    Sections are contiguous and of near-equal size. The first question is the
+    ``industry-sector`` select question the analytics group by, and the first
+    ``required`` questions are marked required.
+    """
+    rng = random.Random(seed)
+    mix = parse_type_mix(type_mix) if isinstance(type_mix, str) else dict(type_mix)
+    types = rng.choices(list(mix), weights=list(mix.values()), k=n_questions)
+    n_sections = max(1, min(n_sections, n_questions))
+    questions, unit_mapping = [], {}
+    for i, question_type in enumerate(types):
+        section = i * n_sections // n_questions
+        question_id = f"q{i:07d}"
+        options = None
+        if i == 0:
+            question_id, question_type, options = "industry-sector", "select", SECTOR_OPTIONS
+        elif question_type == "select":
+            options = [f"Option {k}" for k in range(rng.randint(2, 6))]
+        elif question_type == "number":
+            unit_mapping[question_id] = rng.choice(list(UNITS))
+        questions.append({
+            "question_id": question_id,
+            "section": f"Section {section + 1}",
+            "question_text": f"Synthetic question {i} of type {question_type}?",
+            "question_type": question_type,
+            "options": options,
+            "required": i < required,
+            "calculation_method": "Synthetic calculation method." if question_type == "number" else None,
+            "example": "42" if question_type == "number" else None,
+        })
+    return questions, unit_mapping
+
+
+def _answer(rng, question, unit, invalid_rate):
+    question_type = question["question_type"]
+    if rng.random() < invalid_rate:
+        return {"number": "n/a", "boolean": "maybe", "select": "Other", "text": 7}[question_type]
+    if question_type == "number":
+        # Stay inside the range the validator applies (0-100 for "%").
+        low, high = default_range(question["question_id"], unit)
+        low = low or 0
+        value = round(rng.uniform(low, high) if high is not None else low + rng.lognormvariate(5, 2), 2)
+        return value if rng.random() < 0.7 else f"{value:,}"
+    if question_type == "boolean":
+        return rng.choice(("Yes", "No", True, False))
+    if question_type == "select":
+        return rng.choice(question["options"])
+    return "Synthetic free text answer."
+
+
+def synthetic_responses(questions, n_responses, answers_per_response=100, answer_rate=0.8,
+                        invalid_rate=0.01, companies=None, years=(2023, 2024), unit_mapping=None, seed=0):
+    """Return ``responses`` rows answering a sample of ``questions``.
+
+    Every response answers the same ``answers_per_response`` questions (the
+    first ones of the catalog, so ``industry-sector`` is always included):
+    required ones always, the others with probability ``answer_rate``. About
+    ``invalid_rate`` of the answers fail validation; the rest are valid,
+    including number answers within the range of their ``unit_mapping``
+    unit. Companies answer once per year.
+    """
+    rng = random.Random(seed)
+    unit_mapping = unit_mapping or {}
+    answered = questions[:answers_per_response]
+    companies = companies or max(1, n_responses // len(years))
+    rows = []
+    for i in range(n_responses):
+        answers = {}
+        for question in answered:
+            if question["required"] or rng.random() < answer_rate:
+                answers[question["question_id"]] = _answer(
+                    rng, question, unit_mapping.get(question["question_id"]), invalid_rate)
+        rows.append({
+            "id": f"r{i:08d}",
+            "user_id": f"company-{i % companies}",
+            "year": years[(i // companies) % len(years)],
+            "answers": answers,
+        })
+    return rows
+
+
+def _bench_group(ctx):
+    ctx["script"].build_nested_json(ctx["questions"], ctx["units"])
+    return len(ctx["questions"])
+
+
+def _bench_serialize(ctx):
+    if "document" not in ctx:
+        ctx["document"] = ctx["script"].build_nested_json(ctx["questions"], ctx["units"])
+    json.dumps(ctx["document"], indent=2)
+    return len(ctx["questions"])
+
+
+def _bench_stream(ctx):
+    write_sections(iter_sections(ctx["questions"], ctx["units"]), io.StringIO(), "ndjson")
+    return len(ctx["questions"])
+
+
+def _bench_compile(ctx):
+    Catalog.compile(ctx["questions"], ctx["units"])
+    return len(ctx["questions"])
+
+
+def _catalog(ctx):
+    if "catalog" not in ctx:
+        ctx["catalog"] = Catalog.compile(ctx["questions"], ctx["units"])
+    return ctx["catalog"]
+
+
+def _bench_validate(ctx):
+    if "validator" not in ctx:
+        ctx["validator"] = ResponseValidator.from_catalog(_catalog(ctx))
+    ctx["validator"].validate_batch(ctx["responses"])
+    return len(ctx["responses"])
+
+
+def _answered_numbers(ctx):
+    # Number questions the synthetic responses answer: the first ones of the
+    # catalog, not the ~40% of a 1M catalog that are number questions.
+    if "answered_numbers" not in ctx:
+        answered = set()
+        for row in ctx["responses"]:
+            answered.update(row["answers"])
+        ctx["answered_numbers"] = [question["question_id"] for question in ctx["questions"]
+                                   if question["question_type"] == "number" and question["question_id"] in answered]
+    return ctx["answered_numbers"]
+
+
+def _bench_analytics(ctx):
+    columns = ResponseColumns.from_rows(ctx["responses"], _answered_numbers(ctx))
+    summarize(columns)
+    return len(ctx["responses"])
+
+
+def _bench_normalize(ctx):
+    if "columns" not in ctx:
+        ctx["columns"] = columns = ResponseColumns.from_rows(ctx["responses"], _answered_numbers(ctx))
+        ctx["entered_units"] = {question_id: UNITS[ctx["units"][question_id]]
+                                for question_id in columns.question_ids if question_id in ctx["units"]}
+    # Normalization works in place, so every run converts a fresh copy.
+    columns = copy.copy(ctx["columns"])
+    columns.values, columns.present = columns.values.copy(), columns.present.copy()
+    UnitNormalizer(ctx["units"]).normalize(columns, ctx["entered_units"])
+    return len(ctx["responses"])
+
+
+# name -> (function, unit of the throughput figure). Functions take a shared
+# context and return the number of items processed.
+BENCHMARKS = {
+    "group": (_bench_group, "questions"),
+    "serialize": (_bench_serialize, "questions"),
+    "stream": (_bench_stream, "questions"),
+    "compile": (_bench_compile, "questions"),
+    "validate": (_bench_validate, "responses"),
+    "analytics": (_bench_analytics, "responses"),
+    "normalize": (_bench_normalize, "responses"),
+}
+
+
+def run_benchmarks(sizes, names=None, n_sections=10, type_mix=DEFAULT_TYPE_MIX, n_responses=10000,
+                   answers_per_response=100, repeat=3, memory=True, seed=0):
+    """Run benchmarks for every catalog size; returns ``{"<name>@<size>": result}``.
+
+    The reported time is the best of ``repeat`` untraced runs; peak memory is
+    measured in one extra run under tracemalloc, which would distort timings.
+    """
+    script = _load_script()
+    results = {}
+    for size in sizes:
+        questions, units = synthetic_catalog(size, n_sections, type_mix, seed=seed)
+        ctx = {"script": script, "questions": questions, "units": units,
+               "responses": synthetic_responses(questions, n_responses, answers_per_response,
+                                                unit_mapping=units, seed=seed)}
+        for name in names or BENCHMARKS:
+            function, unit = BENCHMARKS[name]
+            function(ctx)  # warm-up and lazily built fixtures
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                items = function(ctx)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            result = {"seconds": best, "items": items, "unit": unit, "items_per_second": items / best if best else None}
+            if memory:
+                profiler = StageProfiler()
+                with profiler.stage(name):
+                    function(ctx)
+                profiler.stop()
+                result["peak_bytes"] = profiler.stages[0].peak
+            results[f"{name}@{size}"] = result
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return ``(key, metric, baseline, current)`` for each regression beyond ``tolerance``."""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if previous.get(metric) and result.get(metric) is not None \
+                    and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((key, metric, previous[metric], result[metric]))
+    return regressions
+
+
+def _format_results(results, baseline, fh):
+    previous = baseline.get("results", {}) if baseline else {}
+    fh.write(f"{'benchmark':<24}{'ms':>12}{'items/s':>16}{'peak KiB':>14}{'vs baseline':>14}\n")
+    for key, result in results.items():
+        ratio = ""
+        if previous.get(key, {}).get("seconds"):
+            ratio = f"{result['seconds'] / previous[key]['seconds']:.2f}x"
+        peak = f"{result['peak_bytes'] / 1024:,.1f}" if "peak_bytes" in result else "-"
+        rate = f"{result['items_per_second']:,.0f}" if result["items_per_second"] else "-"
+        fh.write(f"{key:<24}{result['seconds'] * 1000:>12.2f}{rate:>16}{peak:>14}{ratio:>14}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the questionnaire pipeline on synthetic data.")
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="Comma-separated catalog sizes in questions (e.g. 1000,100000,1000000).")
+    parser.add_argument("--sections", type=int, default=10, help="Sections per synthetic catalog.")
+    parser.add_argument("--type-mix", default=DEFAULT_TYPE_MIX, help="Question type weights, e.g. text=0.5,number=0.5.")
+    parser.add_argument("--responses", type=int, default=10000, help="Synthetic responses per catalog size.")
+    parser.add_argument("--answers-per-response", type=int, default=100,
+                        help="Questions answered (at most) by each synthetic response.")
+    parser.add_argument("--only", help=f"Comma-separated benchmarks to run ({', '.join(BENCHMARKS)}).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the best is kept.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory run.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as a baseline JSON file.")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative slowdown or memory growth before --compare fails.")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else None
+    unknown = set(names or ()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    results = run_benchmarks([int(size) for size in args.sizes.split(",")], names, args.sections, args.type_mix,
+                             args.responses, args.answers_per_response, args.repeat, not args.no_memory, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    _format_results(results, baseline, sys.stdout)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "parameters": {key: value for key, value in vars(args).items()
+                                      if key not in ("save", "compare", "tolerance")},
+                       "results": results}, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for key, metric, before, after in regressions:
+            print(f"REGRESSION {key} {metric}: {before:,.4g} -> {after:,.4g} ({after / before:.2f}x)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
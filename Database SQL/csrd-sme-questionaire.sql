@@ -1,4 +1,5 @@
 -- CSRD SME Questionnaire SQL
+-- Generated by new-questionaire.py --sql; edit flat_questions there instead.
 
 -- Insert the questionnaire into the questionnaires table
 INSERT INTO public.questionnaires (
@@ -85,7 +86,7 @@ VALUES (
           },
           {
             "question_id": "sustainability-strategy",
-            "question_text": "Provide a brief description of your company's sustainability strategy. E.g. \"We focus on reducing waste and energy consumption.\"",
+            "question_text": "Provide a brief description of your company’s sustainability strategy. E.g. \"We focus on reducing waste and energy consumption.\"",
             "question_type": "text",
             "options": null,
             "required": false
@@ -263,7 +264,7 @@ VALUES (
         "questions": [
           {
             "question_id": "annual-waste-total",
-            "question_text": "What is your company's total annual waste generation in tonnes? E.g. \"20\"",
+            "question_text": "What is your company’s total annual waste generation in tonnes? E.g. \"20\"",
             "question_type": "number",
             "options": null,
             "required": false,
@@ -390,7 +391,7 @@ VALUES (
           },
           {
             "question_id": "human-rights-policy",
-            "question_text": "Please describe your company's human rights policy. E.g. \"We adhere to international standards.\"",
+            "question_text": "Please describe your company’s human rights policy. E.g. \"We adhere to international standards.\"",
             "question_type": "text",
             "options": null,
             "required": false
@@ -1,6 +1,20 @@
+import argparse
+import gzip
 import json
+import os
+import sys
 from collections import defaultdict
 
+from pipeline_profile import StageProfiler
+from prompt_fragments import (DEFAULT_TOKEN_BUDGET, FragmentStore, FragmentTooLargeError, HttpModelClient,
+                              IncompleteReportError, PromptCompiler, ReportGenerator, StubModelClient)
+from questionnaire_catalog import Catalog
+from questionnaire_diff import diff_questionnaires, patch_to_sql
+from questionnaire_sql import DEFAULT_DESCRIPTION, DEFAULT_TITLE, Variant, sql_string, write_copy, write_insert_sql
+from questionnaire_stream import (NonContiguousSectionError, check_contiguous, iter_sections, open_output,
+                                  read_questions, to_output_question, write_sections)
+from variant_build import build_variants
+
 # Flat list of questions (extracted from your SQL insert example).
 # Each dictionary includes all fields, including guidance fields.
 flat_questions = [
@@ -169,35 +183,224 @@ unit_mapping = {
     "staff-training-hours": "hours"
 }
 
-# Create a new nested structure: a dictionary keyed by section,
-# where each value is a list of question dictionaries.
-grouped_questions = defaultdict(list)
-
-for question in flat_questions:
-    # Create a new question dictionary that excludes 'calculation_method' and 'example'
-    new_question = {
-        "question_id": question["question_id"],
-        "question_text": question["question_text"],
-        "question_type": question["question_type"],
-        "options": question["options"],
-        "required": question["required"]
+
+def build_nested_json(questions, units, profiler=None):
+    # ``profiler`` (see pipeline_profile.py) times each stage for --profile.
+    stage = (profiler or StageProfiler(enabled=False)).stage
+
+    with stage("load"):
+        questions = list(questions)
+
+    # Create a new nested structure: a dictionary keyed by section,
+    # where each value is a list of question dictionaries.
+    with stage("group", len(questions)):
+        grouped_questions = defaultdict(list)
+        for question in questions:
+            grouped_questions[question["section"]].append(question)
+
+    # The output question excludes 'calculation_method' and 'example' and,
+    # for number type questions, carries a unit if available in our mapping.
+    # Convert the grouped questions into a list of sections with a title and questions.
+    with stage("attach units", len(questions)):
+        sections = []
+        for section_name, section_questions in grouped_questions.items():
+            sections.append({
+                "section": section_name,
+                "questions": [to_output_question(question, units) for question in section_questions]
+            })
+
+    return {
+        "sections": sections
     }
-    # For number type questions, add a unit if available in our mapping.
-    if question["question_type"] == "number":
-        new_question["unit"] = unit_mapping.get(question["question_id"])
-    grouped_questions[question["section"]].append(new_question)
-
-# Optional: Convert the grouped questions into a list of sections with a title and questions.
-sections = []
-for section_name, questions in grouped_questions.items():
-    sections.append({
-        "section": section_name,
-        "questions": questions
-    })
-
-# Output the nested JSON structure
-nested_json = {
-    "sections": sections
-}
 
-print(json.dumps(nested_json, indent=2))
+
+# Kept between runs so --generate-report only resends changed sections.
+DEFAULT_FRAGMENT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fragment-store.sqlite")
+
+
+def iter_variants(path):
+    # Each row names a question source; units fall back to unit_mapping.
+    for variant in read_questions(path):
+        yield Variant(read_questions(variant["source"]), unit_mapping,
+                      title=variant.get("title", DEFAULT_TITLE),
+                      description=variant.get("description", DEFAULT_DESCRIPTION))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the CSRD SME questionnaire JSON.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write each section as soon as it is complete instead of building the whole document in memory.")
+    parser.add_argument("--source",
+                        help="Read questions lazily from a .jsonl or .csv file (optionally .gz) instead of flat_questions. "
+                             "Implies --stream, so each section's rows must be contiguous in the file.")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                        help="Streaming output format: one compact JSON document or one section per line. "
+                             "ndjson implies --stream.")
+    parser.add_argument("--gzip", action="store_true", help="Gzip-compress the streaming output. Implies --stream.")
+    parser.add_argument("-o", "--output",
+                        help="Output file (defaults to stdout; a .gz suffix implies --gzip). Implies --stream.")
+    parser.add_argument("--compile", metavar="PATH",
+                        help="Write a compiled, memory-mappable catalog (see questionnaire_catalog.py) to PATH.")
+    parser.add_argument("--sql", metavar="PATH",
+                        help="Write INSERT statements for public.questionnaires to PATH ('-' for stdout).")
+    parser.add_argument("--copy", metavar="PATH",
+                        help="Write a PostgreSQL COPY ... FROM STDIN bulk-load file to PATH ('-' for stdout).")
+    parser.add_argument("--variants", metavar="FILE",
+                        help="JSONL file of {\"title\", \"description\", \"source\"} rows, one questionnaire per row, for --sql/--copy.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per INSERT statement for --sql.")
+    parser.add_argument("--build-variants", metavar="MATRIX",
+                        help="Build every variant of a JSON variant matrix (see variant_build.py) into --out-dir.")
+    parser.add_argument("--out-dir", default="variants", help="Output directory for --build-variants.")
+    parser.add_argument("--workers", type=int, help="Processes used by --build-variants (defaults to the CPU count).")
+    parser.add_argument("--force", action="store_true", help="Rebuild variants even if their content hash is cached.")
+    parser.add_argument("--diff", metavar="PREVIOUS",
+                        help="Write a JSON Patch from a previously published questionnaire JSON (optionally .gz) "
+                             "to the current one, to --output or stdout.")
+    parser.add_argument("--diff-sql", metavar="PATH",
+                        help="With --diff, also write the patch as jsonb UPDATE statements to PATH.")
+    parser.add_argument("--questionnaire-id",
+                        help="Row updated by --diff-sql (defaults to matching the questionnaire title).")
+    parser.add_argument("--generate-report", metavar="ANSWERS",
+                        help="Generate a report for a JSON file of {question_id: answer}, reusing cached section "
+                             "text from --fragment-store and sending only changed sections to the model.")
+    parser.add_argument("--fragment-store", default=DEFAULT_FRAGMENT_STORE,
+                        help="SQLite cache used by --generate-report (defaults to .fragment-store.sqlite next to "
+                             "this script; ':memory:' keeps nothing between runs).")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="Prompt tokens per --generate-report request; larger sections are sent in parts.")
+    parser.add_argument("--endpoint",
+                        help="Generate endpoint taking {\"prompt\"} and returning {\"content\"}; "
+                             "without it a local stub answers.")
+    parser.add_argument("--header", action="append", default=[], metavar="NAME: VALUE",
+                        help="Extra HTTP header for --endpoint (e.g. a session cookie).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Report wall time and memory allocations per pipeline stage on stderr.")
+    args = parser.parse_args(argv)
+
+    profiler = StageProfiler(enabled=args.profile)
+    try:
+        _run(args, profiler)
+    finally:
+        profiler.report(sys.stderr)
+
+
+def _run(args, profiler):
+    if args.generate_report:
+        with open(args.generate_report, "r", encoding="utf-8") as fh:
+            answers = json.load(fh)
+        questions = read_questions(args.source) if args.source else flat_questions
+        if args.endpoint:
+            headers = (header.split(":", 1) for header in args.header)
+            client = HttpModelClient(args.endpoint, {name.strip(): value.strip() for name, value in headers})
+        else:
+            client = StubModelClient()
+        store = FragmentStore(args.fragment_store)
+        try:
+            with profiler.stage("generate report"):
+                generator = ReportGenerator(PromptCompiler(questions, unit_mapping), store, client,
+                                            token_budget=args.token_budget)
+                report, stats = generator.generate(answers)
+        except FragmentTooLargeError as exc:
+            sys.exit(f"error: {exc}; raise --token-budget or shorten the answer")
+        except IncompleteReportError as exc:
+            sys.exit(f"error: {exc} ({exc.stats['requests']} request(s) made; generated sections are cached, "
+                     f"run again to retry the rest)")
+        finally:
+            store.close()
+        with open_output(args.output, stdout=sys.stdout) as fh:
+            fh.write(report)
+        print(f"regenerated {stats['regenerated']} of {stats['sections']} sections in {stats['requests']} "
+              f"request(s), ~{stats['prompt_tokens']} prompt tokens", file=sys.stderr)
+        return
+
+    if args.diff:
+        opener = gzip.open if args.diff.endswith(".gz") else open
+        with opener(args.diff, "rt", encoding="utf-8") as fh:
+            previous = json.load(fh)
+        questions = read_questions(args.source) if args.source else flat_questions
+        current = build_nested_json(questions, unit_mapping, profiler)
+        with profiler.stage("diff"):
+            ops = diff_questionnaires(previous, current)
+        with open_output(args.output, compress=args.gzip, stdout=sys.stdout) as fh:
+            json.dump(ops, fh, indent=2, ensure_ascii=False)
+            fh.write("\n")
+        if args.diff_sql:
+            names = [section["section"] for section in current["sections"]]
+            changed_names = names != [section["section"] for section in previous.get("sections", [])]
+            where = f"id = {sql_string(args.questionnaire_id)}" if args.questionnaire_id else None
+            with open(args.diff_sql, "w", encoding="utf-8") as fh:
+                fh.write(patch_to_sql(ops, where=where, section_names=names if changed_names else None))
+        return
+
+    if args.build_variants:
+        with open(args.build_variants, "r", encoding="utf-8") as fh:
+            spec = json.load(fh)
+        with profiler.stage("build variants"):
+            try:
+                result = build_variants(spec, flat_questions, unit_mapping, args.out_dir,
+                                        workers=args.workers, force=args.force)
+            except ValueError as exc:
+                sys.exit(f"error: {args.build_variants}: {exc}")
+        for warning in result["warnings"]:
+            print(f"warning: {warning}", file=sys.stderr)
+        print(f"built {len(result['built'])} variant(s), skipped {len(result['skipped'])} unchanged")
+        for name in result["built"]:
+            print(f"  built {name}")
+        return
+
+    if args.sql or args.copy:
+        for name, path, writer in (("sql", args.sql, write_insert_sql), ("copy", args.copy, write_copy)):
+            if not path:
+                continue
+            # Variants are re-read for each output so only one is held at a time.
+            variants = iter_variants(args.variants) if args.variants else [
+                Variant(read_questions(args.source) if args.source else flat_questions, unit_mapping)]
+            with profiler.stage(name), \
+                    open_output(None if path == "-" else path, compress=args.gzip, stdout=sys.stdout) as fh:
+                if writer is write_insert_sql:
+                    writer(fh, variants, batch_size=args.batch_size)
+                else:
+                    writer(fh, variants)
+        return
+
+    if args.compile:
+        questions = read_questions(args.source) if args.source else flat_questions
+        with profiler.stage("compile"):
+            catalog = Catalog.compile(questions, unit_mapping)
+        with profiler.stage("save"):
+            catalog.save(args.compile)
+        return
+
+    if not (args.stream or args.source or args.output or args.gzip or args.format != "json"):
+        # Output the nested JSON structure
+        document = build_nested_json(flat_questions, unit_mapping, profiler)
+        with profiler.stage("serialize", len(flat_questions)):
+            text = json.dumps(document, indent=2)
+        with profiler.stage("write"):
+            print(text)
+        return
+
+    # Streaming interleaves loading, grouping and serializing, so it is
+    # profiled as a single stage. A file is written under a temporary name
+    # so a failure part-way does not leave a truncated one behind.
+    questions = read_questions(args.source) if args.source else flat_questions
+    target = args.output + ".tmp" if args.output else None
+    compress = args.gzip or bool(args.output and args.output.endswith(".gz"))
+    try:
+        if not args.source:
+            check_contiguous(questions)
+        with profiler.stage("stream"), open_output(target, compress=compress, stdout=sys.stdout) as fh:
+            write_sections(iter_sections(questions, unit_mapping), fh, args.format)
+        if target:
+            os.replace(target, args.output)
+    except NonContiguousSectionError as exc:
+        incomplete = "" if target else " (the output written so far is incomplete)"
+        sys.exit(f"error: {exc}{incomplete}; streaming needs each section's rows together, so sort the "
+                 f"source by section")
+    finally:
+        if target and os.path.exists(target):
+            os.remove(target)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Per-stage wall time and allocation profiling for the questionnaire pipeline.
+
+Used by ``new-questionaire.py --profile`` and by bench_questionnaire.py::
+
+    profiler = StageProfiler()
+    with profiler.stage("group"):
+        ...
+    profiler.report(sys.stderr)
+
+Allocations are measured with tracemalloc, which is only started when a
+profiler is enabled. Stages must not be nested.
+"""
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageResult:
+    __slots__ = ("name", "seconds", "allocated", "peak", "items")
+
+    def __init__(self, name, seconds, allocated, peak, items=None):
+        self.name = name
+        self.seconds = seconds
+        self.allocated = allocated
+        self.peak = peak
+        self.items = items
+
+    def as_dict(self):
+        return {"seconds": self.seconds, "allocated_bytes": self.allocated, "peak_bytes": self.peak,
+                "items": self.items}
+
+
+class StageProfiler:
+    """Records wall time, net allocations and peak memory of named stages."""
+
+    def __init__(self, enabled=True, trace_memory=True):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages = []
+        self._started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    @contextmanager
+    def stage(self, name, items=None):
+        """Time the enclosed block. ``items`` (e.g. question count) is kept for throughput."""
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            allocated = peak = 0
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                allocated, peak = current - before, peak - before
+            self.stages.append(StageResult(name, seconds, allocated, peak, items))
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def report(self, fh):
+        """Write a table of the recorded stages to a text file handle."""
+        self.stop()
+        if not self.enabled:
+            return
+        total = sum(stage.seconds for stage in self.stages) or 1.0
+        fh.write(f"{'stage':<16}{'wall ms':>12}{'share':>8}{'alloc KiB':>14}{'peak KiB':>12}{'items/s':>14}\n")
+        for stage in self.stages:
+            rate = f"{stage.items / stage.seconds:,.0f}" if stage.items and stage.seconds else "-"
+            fh.write(f"{stage.name:<16}{stage.seconds * 1000:>12.2f}{stage.seconds / total:>8.1%}"
+                     f"{stage.allocated / 1024:>14,.1f}{stage.peak / 1024:>12,.1f}{rate:>14}\n")
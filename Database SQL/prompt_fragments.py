@@ -0,0 +1,303 @@
+"""Cached, per-section prompt fragments for report generation.
+
+``PromptCompiler`` precompiles every section of the catalog into question
+lines that keep the ``calculation_method``/``example`` guidance the
+questionnaire output drops. Only the answers still have to be filled in.
+A section's fragment is keyed by (section, hash of that section's answers).
+
+``FragmentStore`` is a SQLite cache of those fragments and of the text the
+model generated for them. ``ReportGenerator`` reuses the cached text of every
+section whose answers are unchanged and sends only the changed sections, so
+regenerating a report after a small edit sends a fraction of the original
+prompt. Each section is generated in a request of its own: text written with
+other sections in view could quote their data (the company name, say), and
+the cache would then hand it to another company that gave the same answers
+for this section only. A section whose prompt would exceed the token budget
+is sent in parts, each repeating the section header; a single question over
+the budget is rejected before any request is made.
+
+The model is called through a client with a ``complete(prompt)`` method:
+``HttpModelClient`` posts to the app's ``/api/generate`` route, and
+``StubModelClient`` answers locally for tests and dry runs.
+"""
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import urllib.request
+from collections import OrderedDict
+
+# Bump when the fragment layout changes so cached entries are not reused.
+FRAGMENT_VERSION = "2"
+
+# Prompt tokens per request, instructions included.
+DEFAULT_TOKEN_BUDGET = 6000
+
+INSTRUCTIONS = """You are provided with structured data extracted from a CSRD survey for SMEs. Each section starts with a "## " header and lists questions (prefixed with "Q:"), their answers (prefixed with "A:") and, where available, the unit, calculation method and an example answer as guidance.
+
+Write the corresponding part of a formal Corporate Sustainability Reporting Directive (CSRD) report for the section below, using only the provided data and integrating it into a narrative that highlights the company's sustainability performance, key metrics and initiatives. Start the text with the same "## " header line, exactly as given, and write nothing before it.
+
+Input Data:
+"""
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) without a tokenizer."""
+    return math.ceil(len(text) / 4)
+
+
+def _format_answer(value):
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class PromptCompiler:
+    """Per-section prompt templates compiled from flat question rows."""
+
+    def __init__(self, questions, unit_mapping):
+        self.sections = OrderedDict()
+        for question in questions:
+            lines = [f"Q: {question['question_text']}"]
+            unit = question.get("unit", unit_mapping.get(question["question_id"]))
+            if question["question_type"] == "number" and unit:
+                lines.append(f"Unit: {unit}")
+            if question.get("calculation_method"):
+                lines.append(f"Method: {question['calculation_method']}")
+            if question.get("example"):
+                lines.append(f"Example: {question['example']}")
+            self.sections.setdefault(question["section"], []).append(
+                (question["question_id"], "\n".join(lines) + "\nA: "))
+        # Cached entries must not outlive an edit to the questions themselves.
+        self._template_hashes = {
+            section: hashlib.sha256(json.dumps(templates, ensure_ascii=False).encode("utf-8")).hexdigest()
+            for section, templates in self.sections.items()
+        }
+
+    def answers_hash(self, section, answers):
+        """Hash of the answers that belong to ``section``."""
+        relevant = [answers.get(question_id) for question_id, _ in self.sections[section]]
+        canonical = json.dumps([FRAGMENT_VERSION, section, self._template_hashes[section], relevant],
+                               ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _parts(self, section, answers):
+        # (question_id, rendered question) for every answered question.
+        for question_id, template in self.sections[section]:
+            value = answers.get(question_id)
+            if value is None or value == "" or value == "N/A":
+                continue
+            yield question_id, template + _format_answer(value) + "\n\n"
+
+    def fragment(self, section, answers):
+        """Render one section; unanswered questions are left out entirely.
+
+        Returns an empty string when none of the section's questions is answered.
+        """
+        parts = [part for _, part in self._parts(section, answers)]
+        return f"## {section}\n\n" + "".join(parts) if parts else ""
+
+    def chunks(self, section, answers, budget, overhead=0):
+        """Split a section's fragment into fragments that fit ``budget`` tokens.
+
+        ``overhead`` is what every prompt adds (the instructions). Every chunk
+        starts with the section header. Raises FragmentTooLargeError when a
+        single answered question does not fit.
+        """
+        header = f"## {section}\n\n"
+        base = overhead + estimate_tokens(header)
+        chunks, current, used = [], [], base
+        for question_id, part in self._parts(section, answers):
+            tokens = estimate_tokens(part)
+            if base + tokens > budget:
+                raise FragmentTooLargeError(section, question_id, base + tokens, budget)
+            if current and used + tokens > budget:
+                chunks.append(header + "".join(current))
+                current, used = [], base
+            current.append(part)
+            used += tokens
+        if current:
+            chunks.append(header + "".join(current))
+        return chunks
+
+
+class FragmentStore:
+    """SQLite cache of section fragments and their generated text."""
+
+    def __init__(self, path=":memory:"):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fragments ("
+            " section TEXT NOT NULL, answers_hash TEXT NOT NULL, fragment TEXT NOT NULL,"
+            " tokens INTEGER NOT NULL, output TEXT,"
+            " PRIMARY KEY (section, answers_hash))"
+        )
+
+    def get(self, section, answers_hash):
+        """Return ``(fragment, tokens, output)`` or None."""
+        return self.connection.execute(
+            "SELECT fragment, tokens, output FROM fragments WHERE section = ? AND answers_hash = ?",
+            (section, answers_hash)).fetchone()
+
+    def put(self, section, answers_hash, fragment, tokens, output=None):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO fragments (section, answers_hash, fragment, tokens, output) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (section, answers_hash) DO UPDATE SET output = COALESCE(excluded.output, output)",
+                (section, answers_hash, fragment, tokens, output))
+
+    def close(self):
+        self.connection.close()
+
+
+def split_sections(text, sections):
+    """Split a model response on the ``## <section>`` headers it was asked to keep."""
+    wanted = set(sections)
+    found, current, lines = {}, None, []
+    for line in text.splitlines(keepends=True):
+        header = line[3:].strip() if line.startswith("## ") else None
+        if header in wanted:
+            if current is not None:
+                found[current] = "".join(lines).strip() + "\n"
+            current, lines = header, [line]
+        elif current is not None:
+            lines.append(line)
+    if current is not None:
+        found[current] = "".join(lines).strip() + "\n"
+    return found
+
+
+class HttpModelClient:
+    """Posts ``{"prompt": ...}`` to a generate endpoint and returns its ``content``."""
+
+    def __init__(self, url, headers=None, timeout=300):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+
+    def complete(self, prompt):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"prompt": prompt}).encode("utf-8"), method="POST",
+            headers=dict({"Content-Type": "application/json"}, **self.headers))
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)["content"]
+
+
+class StubModelClient:
+    """Local stand-in for the model: echoes each section header with a summary line."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def complete(self, prompt):
+        self.prompts.append(prompt)
+        data = prompt.split(INSTRUCTIONS, 1)[-1]
+        headers = re.findall(r"^## (.+)$", data, flags=re.MULTILINE)
+        return "".join(f"## {header}\n\nGenerated text for {header} "
+                       f"({data.count('Q: ')} answered questions in request).\n\n" for header in headers)
+
+
+class FragmentTooLargeError(ValueError):
+    """Raised when one answered question alone exceeds the token budget."""
+
+    def __init__(self, section, question_id, tokens, budget):
+        super().__init__(f"Question {question_id!r} in section {section!r} needs ~{tokens} prompt tokens, "
+                         f"over the token budget of {budget}")
+        self.section = section
+        self.question_id = question_id
+
+
+class IncompleteReportError(RuntimeError):
+    """Raised when the model's responses left out sections even after retrying.
+
+    ``report`` holds the sections that were generated and ``stats`` lists the
+    rest under ``"missing"``. The generated ones are cached, so running again
+    only requests the missing sections.
+    """
+
+    def __init__(self, missing, report, stats):
+        super().__init__(f"No text generated for section(s): {', '.join(missing)}")
+        self.missing = missing
+        self.report = report
+        self.stats = stats
+
+
+class ReportGenerator:
+    """Assembles a report from cached section text, regenerating only changed sections."""
+
+    def __init__(self, compiler, store, client, retries=1, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.compiler = compiler
+        self.store = store
+        self.client = client
+        self.retries = retries
+        self.token_budget = token_budget
+
+    def generate(self, answers):
+        """Return ``(report_text, stats)`` for one company's answers.
+
+        A section over ``token_budget`` (by its stored token count) is sent
+        in parts whose texts are joined. A response without the section's
+        ``## `` header is retried up to ``retries`` times; sections still
+        missing raise IncompleteReportError.
+        """
+        outputs, pending = {}, []
+        for section in self.compiler.sections:
+            answers_hash = self.compiler.answers_hash(section, answers)
+            cached = self.store.get(section, answers_hash)
+            if cached is not None and cached[2] is not None:
+                outputs[section] = cached[2]
+                continue
+            if cached is not None:
+                fragment, tokens = cached[0], cached[1]
+            else:
+                fragment = self.compiler.fragment(section, answers)
+                tokens = estimate_tokens(fragment)
+                # A section without answers has nothing to generate.
+                self.store.put(section, answers_hash, fragment, tokens, None if fragment else "")
+                if not fragment:
+                    outputs[section] = ""
+                    continue
+            pending.append((section, fragment, tokens, answers_hash))
+
+        # Split oversized sections before sending anything, so a question that
+        # can never fit fails the run without spending requests.
+        overhead = estimate_tokens(INSTRUCTIONS)
+        pending = [(section, fragment, tokens, answers_hash,
+                    [fragment] if overhead + tokens <= self.token_budget
+                    else self.compiler.chunks(section, answers, self.token_budget, overhead))
+                   for section, fragment, tokens, answers_hash in pending]
+
+        stats = {"sections": len(self.compiler.sections), "regenerated": 0,
+                 "requests": 0, "prompt_tokens": 0, "retries": 0, "missing": []}
+        for section, fragment, tokens, answers_hash, chunks in pending:
+            texts = []
+            for chunk in chunks:
+                text = self._complete(section, INSTRUCTIONS + chunk, stats)
+                if text is None:
+                    stats["missing"].append(section)
+                    break
+                # Later parts continue the first one under its header.
+                texts.append(text if not texts else text.split("\n", 1)[1].lstrip("\n"))
+            else:
+                outputs[section] = "\n".join(texts)
+                self.store.put(section, answers_hash, fragment, tokens, outputs[section])
+                stats["regenerated"] += 1
+        report = "\n".join(outputs[section] for section in self.compiler.sections if outputs.get(section))
+        if stats["missing"]:
+            raise IncompleteReportError(stats["missing"], report, stats)
+        return report, stats
+
+    def _complete(self, section, prompt, stats):
+        # The section's text from one prompt, or None once the retries are used up.
+        for attempt in range(self.retries + 1):
+            response = self.client.complete(prompt)
+            stats["requests"] += 1
+            stats["retries"] += bool(attempt)
+            stats["prompt_tokens"] += estimate_tokens(prompt)
+            generated = split_sections(response, [section])
+            if section in generated:
+                return generated[section]
+        return None
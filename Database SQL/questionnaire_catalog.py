@@ -0,0 +1,325 @@
+"""Compiled, indexed form of the questionnaire catalog.
+
+``Catalog.compile`` turns flat question rows into column arrays grouped by
+section, with interned section/type strings, a per-section offset table and a
+question_id hash index. ``Catalog.save`` writes the same columns to a compact
+binary file that ``Catalog.load`` memory-maps without decoding, so workers can
+open a large catalog without executing the Python literal in new-questionaire.py.
+
+File layout (little-endian, every block 4-byte aligned)::
+
+    header          magic, version, n_questions, n_sections, n_strings,
+                    hash_size, blob_size
+    string offsets  u32[n_strings + 1]     into the UTF-8 blob
+    section names   u32[n_sections]        string index
+    section starts  u32[n_sections + 1]    question offset table
+    id, text, type  u32[n_questions] each  string index
+    unit, options   i32[n_questions] each  string index or -1 for null
+    section, pos    u32[n_questions] each
+    required        u8[n_questions]
+    hash index      u32[hash_size]         question row + 1, 0 for empty
+    blob            UTF-8 bytes of every distinct string
+"""
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b"CSRDCAT1"
+VERSION = 1
+HEADER = struct.Struct("<8s6I")
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+class CompiledQuestion:
+    """A single catalog question, materialized on demand."""
+
+    __slots__ = ("question_id", "section", "section_index", "position", "question_text",
+                 "question_type", "options", "required", "unit")
+
+    def __init__(self, question_id, section, section_index, position, question_text,
+                 question_type, options, required, unit):
+        self.question_id = question_id
+        self.section = section
+        self.section_index = section_index
+        self.position = position
+        self.question_text = question_text
+        self.question_type = question_type
+        self.options = options
+        self.required = required
+        self.unit = unit
+
+    def __repr__(self):
+        return f"CompiledQuestion({self.question_id!r}, section={self.section_index}, position={self.position})"
+
+
+def _hash_size(n):
+    # Power of two with a load factor of at most one half.
+    size = 8
+    while size < 2 * n:
+        size <<= 1
+    return size
+
+
+def _build_hash_index(id_bytes, size):
+    mask = size - 1
+    table = array("I", bytes(4 * size))
+    for row, key in enumerate(id_bytes):
+        slot = zlib.crc32(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = row + 1
+    return table
+
+
+def _column(view, offset, typecode, count):
+    # Zero-copy view on little-endian hosts, byte-swapped copy elsewhere.
+    itemsize = struct.calcsize(typecode)
+    end = offset + itemsize * count
+    if _LITTLE_ENDIAN or itemsize == 1:
+        return view[offset:end].cast(typecode), _align(end)
+    column = array(typecode, view[offset:end].tobytes())
+    column.byteswap()
+    return column, _align(end)
+
+
+def _align(offset):
+    return (offset + 3) & ~3
+
+
+class Catalog:
+    """Array-backed questionnaire catalog with O(1) question_id lookup."""
+
+    def __init__(self, strings, blob, section_names, section_starts, ids, texts, types, units,
+                 options, section_of, positions, required, hash_index, mapped=None):
+        # ``strings`` is either a list of str (freshly compiled) or a u32
+        # offset column into ``blob`` (memory-mapped).
+        self._strings = strings
+        self._blob = blob
+        self._section_name_ids = section_names
+        # Copied out of the map (it has one entry per section) so callers can
+        # keep it after close().
+        self.section_starts = array("I", section_starts)
+        self._ids = ids
+        self._texts = texts
+        self._types = types
+        self._units = units
+        self._options = options
+        self._section_of = section_of
+        self._positions = positions
+        self._required = required
+        self._hash_index = hash_index
+        self._mask = len(hash_index) - 1
+        self._mapped = mapped
+        self._cache = {}
+        # Section and type strings are few and hot; decode and intern them once.
+        self.sections = [self._interned(i) for i in section_names]
+
+    # -- construction ---------------------------------------------------
+
+    @classmethod
+    def compile(cls, questions, unit_mapping=None):
+        """Compile flat question rows into a catalog.
+
+        Rows are grouped by section in order of first appearance, as the
+        questionnaire output does. Duplicate question_ids raise ValueError.
+        """
+        unit_mapping = unit_mapping or {}
+        strings = []
+        string_ids = {}
+
+        def intern_string(value):
+            index = string_ids.get(value)
+            if index is None:
+                index = string_ids[value] = len(strings)
+                strings.append(sys.intern(value))
+            return index
+
+        grouped = {}
+        for question in questions:
+            grouped.setdefault(question["section"], []).append(question)
+
+        section_names = array("I")
+        section_starts = array("I", [0])
+        ids, texts, types, section_of, positions = (array("I") for _ in range(5))
+        units, options = array("i"), array("i")
+        required = array("B")
+        seen = set()
+        for section_index, (section_name, section_questions) in enumerate(grouped.items()):
+            section_names.append(intern_string(section_name))
+            for position, question in enumerate(section_questions):
+                question_id = question["question_id"]
+                if question_id in seen:
+                    raise ValueError(f"Duplicate question_id {question_id!r}")
+                seen.add(question_id)
+                ids.append(intern_string(question_id))
+                texts.append(intern_string(question["question_text"]))
+                types.append(intern_string(question["question_type"]))
+                unit = None
+                if question["question_type"] == "number":
+                    unit = question["unit"] if "unit" in question else unit_mapping.get(question_id)
+                units.append(-1 if unit is None else intern_string(unit))
+                choices = question.get("options")
+                options.append(-1 if choices is None else intern_string(json.dumps(choices, ensure_ascii=False)))
+                section_of.append(section_index)
+                positions.append(position)
+                required.append(1 if question.get("required") else 0)
+            section_starts.append(len(ids))
+
+        hash_index = _build_hash_index([strings[i].encode("utf-8") for i in ids], _hash_size(len(ids)))
+        return cls(strings, None, section_names, section_starts, ids, texts, types, units,
+                   options, section_of, positions, required, hash_index)
+
+    def save(self, path):
+        """Write the catalog in the binary layout described in the module docstring."""
+        encoded = [self._string(i).encode("utf-8") for i in range(self._string_count())]
+        offsets = array("I", [0])
+        for value in encoded:
+            offsets.append(offsets[-1] + len(value))
+        blocks = [offsets, self._section_name_ids, self.section_starts, self._ids, self._texts,
+                  self._types, self._units, self._options, self._section_of, self._positions,
+                  self._required, self._hash_index]
+        with open(path, "wb") as fh:
+            fh.write(HEADER.pack(MAGIC, VERSION, len(self), len(self.sections), len(encoded),
+                                 len(self._hash_index), offsets[-1]))
+            for block in blocks:
+                column = array(block.typecode if isinstance(block, array) else block.format, block)
+                if not _LITTLE_ENDIAN:
+                    column.byteswap()
+                data = column.tobytes()
+                fh.write(data)
+                fh.write(b"\0" * (_align(len(data)) - len(data)))
+            fh.write(b"".join(encoded))
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a catalog file written by ``save``."""
+        with open(path, "rb") as fh:
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        magic, version, n_questions, n_sections, n_strings, hash_size, blob_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} questionnaire catalog")
+        offset = HEADER.size
+        offsets, offset = _column(view, offset, "I", n_strings + 1)
+        section_names, offset = _column(view, offset, "I", n_sections)
+        section_starts, offset = _column(view, offset, "I", n_sections + 1)
+        columns = []
+        for typecode in "IIIiiII":
+            column, offset = _column(view, offset, typecode, n_questions)
+            columns.append(column)
+        required, offset = _column(view, offset, "B", n_questions)
+        hash_index, offset = _column(view, offset, "I", hash_size)
+        blob = view[offset:offset + blob_size]
+        return cls(offsets, blob, section_names, section_starts, *columns, required,
+                   hash_index, mapped=mapped)
+
+    def close(self):
+        """Release the memory map of a loaded catalog."""
+        mapped = self._mapped
+        if mapped is None:
+            return
+        # Every column is a view on the map; drop them before closing it.
+        for name in ("_strings", "_blob", "_section_name_ids", "_ids", "_texts",
+                     "_types", "_units", "_options", "_section_of", "_positions", "_required",
+                     "_hash_index"):
+            setattr(self, name, None)
+        self._mapped = None
+        mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # -- strings ----------------------------------------------------------
+
+    def _string_count(self):
+        return len(self._strings) if self._blob is None else len(self._strings) - 1
+
+    def _string(self, index):
+        if self._blob is None:
+            return self._strings[index]
+        return str(self._blob[self._strings[index]:self._strings[index + 1]], "utf-8")
+
+    def _interned(self, index):
+        value = self._cache.get(index)
+        if value is None:
+            value = self._cache[index] = sys.intern(self._string(index))
+        return value
+
+    def _optional(self, index):
+        return None if index < 0 else self._interned(index)
+
+    # -- lookup -----------------------------------------------------------
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, question_id):
+        return self.row_of(question_id) is not None
+
+    def row_of(self, question_id):
+        """Return the row number of ``question_id`` or None."""
+        key = question_id.encode("utf-8")
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            row = self._hash_index[slot]
+            if not row:
+                return None
+            if self._string(self._ids[row - 1]) == question_id:
+                return row - 1
+            slot = (slot + 1) & self._mask
+
+    def lookup(self, question_id):
+        """Return ``(section_index, position, question_type, unit)`` for a question_id.
+
+        Raises KeyError for unknown ids.
+        """
+        row = self.row_of(question_id)
+        if row is None:
+            raise KeyError(question_id)
+        return (self._section_of[row], self._positions[row],
+                self._interned(self._types[row]), self._optional(self._units[row]))
+
+    def question(self, row):
+        """Materialize the question at ``row``."""
+        section_index = self._section_of[row]
+        options = self._options[row]
+        return CompiledQuestion(
+            question_id=self._string(self._ids[row]),
+            section=self.sections[section_index],
+            section_index=section_index,
+            position=self._positions[row],
+            question_text=self._string(self._texts[row]),
+            question_type=self._interned(self._types[row]),
+            options=None if options < 0 else json.loads(self._string(options)),
+            required=bool(self._required[row]),
+            unit=self._optional(self._units[row]),
+        )
+
+    def get(self, question_id, default=None):
+        row = self.row_of(question_id)
+        return default if row is None else self.question(row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.question(row)
+
+    def section_range(self, section_index):
+        """Return the ``range`` of rows belonging to a section."""
+        return range(self.section_starts[section_index], self.section_starts[section_index + 1])
+
+    def iter_section(self, section_index):
+        for row in self.section_range(section_index):
+            yield self.question(row)
+
+    def question_ids(self, question_type=None):
+        """Return question_ids in catalog order, optionally filtered by type."""
+        return [self._string(self._ids[row]) for row in range(len(self))
+                if question_type is None or self._interned(self._types[row]) == question_type]
@@ -0,0 +1,248 @@
+"""Minimal JSON Patch deltas between two questionnaire outputs.
+
+``diff_questionnaires`` compares a previously published ``{"sections": [...]}``
+document with the current one and returns an RFC 6902 JSON Patch. Sections are
+matched by title and questions by question_id, so a reordering becomes a few
+``move`` operations instead of a full replace. Only the items outside the
+longest run that kept its relative order are moved, and their indices are
+tracked in a Fenwick tree, so even a full reversal diffs in O(n log n). A list
+that would need more than ``MAX_MOVES`` moves is replaced as a whole instead,
+since every move becomes a row rewrite of its own in SQL. Unchanged questions
+produce no operations at all.
+
+``patch_to_sql`` turns such a patch into ``UPDATE`` statements built from
+``jsonb_set``, ``jsonb_insert`` and ``#-`` on ``public.questionnaires``.
+"""
+import bisect
+import json
+
+from questionnaire_sql import DEFAULT_TITLE, TABLE, sql_string
+
+# Number of patch operations folded into one UPDATE expression.
+SQL_BATCH_SIZE = 100
+
+# Moves within one list above which the list is replaced as a whole.
+MAX_MOVES = 50
+
+
+def _escape(token):
+    # JSON Pointer (RFC 6901) escaping of a path segment.
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _stable_items(old_positions):
+    # Indices (into ``old_positions``) of a longest increasing subsequence:
+    # the items that can stay where they are while the others move.
+    tails, tail_index, previous = [], [], [None] * len(old_positions)
+    for i, position in enumerate(old_positions):
+        k = bisect.bisect_left(tails, position)
+        if k == len(tails):
+            tails.append(position)
+            tail_index.append(i)
+        else:
+            tails[k] = position
+            tail_index[k] = i
+        previous[i] = tail_index[k - 1] if k else None
+    stable = set()
+    i = tail_index[-1] if tail_index else None
+    while i is not None:
+        stable.add(i)
+        i = previous[i]
+    return stable
+
+
+class _Fenwick:
+    # Binary indexed tree of slot occupancy: O(log n) updates and prefix counts.
+    __slots__ = ("tree",)
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, slot, delta):
+        slot += 1
+        tree = self.tree
+        while slot < len(tree):
+            tree[slot] += delta
+            slot += slot & -slot
+
+    def count_before(self, slot):
+        total, tree = 0, self.tree
+        while slot > 0:
+            total += tree[slot]
+            slot -= slot & -slot
+        return total
+
+
+def _diff_keyed_list(old, new, key, path, ops, diff_item, max_moves=MAX_MOVES):
+    """Append ops turning list ``old`` into ``new``, matching items by ``key``.
+
+    When more than ``max_moves`` items would have to move, the whole list is
+    replaced instead (None means no limit).
+    """
+    new_keys = [item[key] for item in new]
+    if len(set(new_keys)) != len(new_keys):
+        raise ValueError(f"Duplicate {key} values under {path or '/'}")
+    wanted = set(new_keys)
+    list_ops = []
+
+    # 1. Removals, highest index first so earlier indices stay valid.
+    for index in range(len(old) - 1, -1, -1):
+        if old[index][key] not in wanted:
+            list_ops.append({"op": "remove", "path": f"{path}/{index}"})
+    current = [item[key] for item in old if item[key] in wanted]
+    old_items = {item[key]: item for item in old}
+
+    # 2. Moves and additions. Items on the longest increasing run of old
+    # positions stay put; every other item is placed right after its new
+    # predecessor, which rebuilds the new order with one op per such item.
+    position_in_current = {k: i for i, k in enumerate(current)}
+    kept = [k for k in new_keys if k in position_in_current]
+    stable = {kept[i] for i in _stable_items([position_in_current[k] for k in kept])}
+
+    # Placed items only ever sit right after their new predecessor, so the
+    # items following a stable one (in new order) form a run right behind its
+    # old position. Laying out every old position and every run up front
+    # turns "index of an item" into a prefix count over occupied slots.
+    run_slot, layout, anchor, run_length = {}, [], -1, 0
+    for k in new_keys:
+        if k in stable:
+            anchor, run_length = position_in_current[k], 0
+        else:
+            layout.append((anchor, 1, run_length, k))
+            run_length += 1
+    layout.extend((position, 0, 0, k) for k, position in position_in_current.items())
+    layout.sort(key=lambda entry: entry[:3])
+    old_slot = {}
+    for slot, (_, kind, _, k) in enumerate(layout):
+        (old_slot if kind == 0 else run_slot)[k] = slot
+    occupied = _Fenwick(len(layout))
+    for slot in old_slot.values():
+        occupied.add(slot, 1)
+
+    moves = 0
+    for target, k in enumerate(new_keys):
+        if k in stable:
+            continue
+        if k in old_items:
+            source = occupied.count_before(old_slot[k])
+            occupied.add(old_slot[k], -1)
+            index = occupied.count_before(run_slot[k])
+            if index != source:
+                list_ops.append({"op": "move", "from": f"{path}/{source}", "path": f"{path}/{index}"})
+                moves += 1
+        else:
+            index = occupied.count_before(run_slot[k])
+            list_ops.append({"op": "add", "path": f"{path}/{index}", "value": new[target]})
+        occupied.add(run_slot[k], 1)
+
+    if max_moves is not None and moves > max_moves:
+        # Each move rewrites the row on its own (see patch_to_sql); past this
+        # point one replace of the list is the cheaper delta.
+        ops.append({"op": "replace", "path": path, "value": new})
+        return
+    ops.extend(list_ops)
+
+    # 3. Field changes of matched items, now at their final index.
+    for index, item in enumerate(new):
+        previous = old_items.get(item[key])
+        if previous is not None and previous != item:
+            diff_item(previous, item, f"{path}/{index}", ops)
+
+
+def _diff_object(old, new, path, ops):
+    for name in old:
+        if name not in new:
+            ops.append({"op": "remove", "path": f"{path}/{_escape(name)}"})
+    for name, value in new.items():
+        if name not in old:
+            ops.append({"op": "add", "path": f"{path}/{_escape(name)}", "value": value})
+        elif old[name] != value:
+            ops.append({"op": "replace", "path": f"{path}/{_escape(name)}", "value": value})
+
+
+def diff_questionnaires(old, new, max_moves=MAX_MOVES):
+    """Return the JSON Patch (list of ops) turning document ``old`` into ``new``.
+
+    A list (the sections, or one section's questions) in which more than
+    ``max_moves`` items changed place is replaced in one op rather than
+    patched move by move; pass None to always emit moves.
+    """
+    def diff_section(old_section, new_section, path, ops):
+        _diff_object({k: v for k, v in old_section.items() if k != "questions"},
+                     {k: v for k, v in new_section.items() if k != "questions"}, path, ops)
+        _diff_keyed_list(old_section.get("questions", []), new_section.get("questions", []), "question_id",
+                         f"{path}/questions", ops, _diff_object, max_moves)
+
+    ops = []
+    _diff_keyed_list(old.get("sections", []), new.get("sections", []), "section", "/sections", ops,
+                     diff_section, max_moves)
+    return ops
+
+
+def _pg_path(pointer):
+    # JSON Pointer -> text[] literal for jsonb_set / #- / #>.
+    tokens = [_unescape(token) for token in pointer.split("/")[1:]]
+    quoted = ('"' + token.replace("\\", "\\\\").replace('"', '\\"') + '"' for token in tokens)
+    return sql_string("{" + ",".join(quoted) + "}")
+
+
+def _jsonb(value):
+    return sql_string(json.dumps(value, ensure_ascii=False)) + "::jsonb"
+
+
+def _apply_sql(expression, op):
+    path = _pg_path(op["path"])
+    if op["op"] == "replace":
+        return f"jsonb_set({expression}, {path}, {_jsonb(op['value'])}, false)"
+    if op["op"] == "remove":
+        return f"({expression} #- {path})"
+    if op["op"] == "add":
+        # Array members are inserted before the given index (or appended when
+        # it is past the end); object members are created.
+        if op["path"].rsplit("/", 1)[1].isdigit():
+            return f"jsonb_insert({expression}, {path}, {_jsonb(op['value'])})"
+        return f"jsonb_set({expression}, {path}, {_jsonb(op['value'])}, true)"
+    if op["op"] == "move":
+        source = _pg_path(op["from"])
+        return f"jsonb_insert(({expression} #- {source}), {path}, ({expression} #> {source}))"
+    raise ValueError(f"Unsupported patch op {op['op']!r}")
+
+
+def patch_to_sql(ops, where=None, section_names=None, batch_size=SQL_BATCH_SIZE):
+    """Render patch ops as UPDATE statements on the ``questions`` column.
+
+    Up to ``batch_size`` ops are folded into one nested expression per UPDATE.
+    A ``move`` reads the column twice, so it always gets a statement of its
+    own instead of doubling the expression it is nested in; patches from
+    ``diff_questionnaires`` keep that to ``MAX_MOVES`` per list. ``where``
+    defaults to matching the default questionnaire title. When
+    ``section_names`` is given, the ``sections`` title list is replaced too.
+    """
+    where = where or f"title = {sql_string(DEFAULT_TITLE)}"
+    statements = ["BEGIN;"]
+
+    def update(column, expression):
+        statements.append(f"UPDATE {TABLE}\nSET {column} = {expression},\n    updated_at = current_timestamp\n"
+                          f"WHERE {where};")
+
+    expression, pending = "questions", 0
+    for op in ops:
+        if op["op"] == "move" or pending == batch_size:
+            if pending:
+                update("questions", expression)
+            expression, pending = "questions", 0
+        expression = _apply_sql(expression, op)
+        pending += 1
+        if op["op"] == "move":
+            update("questions", expression)
+            expression, pending = "questions", 0
+    if pending:
+        update("questions", expression)
+    if section_names is not None:
+        update("sections", _jsonb({"sections": section_names}))
+    statements.append("COMMIT;")
+    return "\n\n".join(statements) + "\n"
@@ -0,0 +1,132 @@
+"""SQL and bulk-load output for questionnaire variants.
+
+``write_insert_sql`` produces the seed script that used to be maintained by
+hand as csrd-sme-questionaire.sql, batching several variants per INSERT.
+``write_copy`` produces a PostgreSQL ``COPY ... FROM STDIN`` file so thousands
+of sector/language variants load in one statement. Both stream every variant's
+sections straight into the output; the escaping for the SQL literal or the
+COPY text format is applied to each chunk as it is written.
+"""
+import json
+
+from questionnaire_stream import iter_sections
+
+DEFAULT_TITLE = "CSRD SME Sustainability Assessment"
+DEFAULT_DESCRIPTION = ("A comprehensive questionnaire designed to help SMEs assess their "
+                       "sustainability performance and CSRD readiness.")
+
+TABLE = "public.questionnaires"
+COPY_COLUMNS = ("title", "description", "questions", "sections", "created_at", "updated_at")
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+class Variant:
+    """One questionnaire row: a title, a description and its question rows."""
+
+    __slots__ = ("title", "description", "questions", "unit_mapping")
+
+    def __init__(self, questions, unit_mapping, title=DEFAULT_TITLE, description=DEFAULT_DESCRIPTION):
+        self.title = title
+        self.description = description
+        self.questions = questions
+        self.unit_mapping = unit_mapping
+
+
+def sql_string(value):
+    """Quote a Python string as a standard SQL string literal (``NULL`` for None)."""
+    if value is None:
+        return "NULL"
+    return "'" + value.replace("'", "''") + "'"
+
+
+def copy_field(value):
+    """Escape a value for the COPY text format (``\\N`` for null)."""
+    if value is None:
+        return "\\N"
+    return value.translate(_COPY_ESCAPES)
+
+
+def _write_sections_json(sections, write, indent=None, prefix=""):
+    # Writes {"sections": [...]} one section at a time and returns the
+    # section names. With ``indent`` the output matches json.dumps(indent=...)
+    # with every line after the first shifted right by ``prefix``.
+    names = []
+    if indent is None:
+        write('{"sections":[')
+        for section in sections:
+            if names:
+                write(",")
+            write(json.dumps(section, ensure_ascii=False, separators=(",", ":")))
+            names.append(section["section"])
+        write("]}")
+        return names
+
+    step = " " * indent
+    write("{\n" + prefix + step + '"sections": [')
+    for section in sections:
+        write(",\n" if names else "\n")
+        text = json.dumps(section, ensure_ascii=False, indent=indent)
+        write(prefix + step * 2 + text.replace("\n", "\n" + prefix + step * 2))
+        names.append(section["section"])
+    if names:
+        write("\n" + prefix + step)
+    write("]\n" + prefix + "}")
+    return names
+
+
+def _section_names_json(names, indent=None, prefix=""):
+    if indent is None:
+        return json.dumps({"sections": names}, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps({"sections": names}, ensure_ascii=False, indent=indent).replace("\n", "\n" + prefix)
+
+
+def write_insert_sql(fh, variants, batch_size=500):
+    """Write INSERT statements for ``variants``, ``batch_size`` rows per statement.
+
+    Returns the number of rows written.
+    """
+    def write(chunk):
+        fh.write(chunk.replace("'", "''"))
+
+    fh.write("-- CSRD SME Questionnaire SQL\n")
+    fh.write("-- Generated by new-questionaire.py --sql; edit flat_questions there instead.\n")
+    rows = 0
+    for variant in variants:
+        if rows % batch_size == 0:
+            if rows:
+                fh.write(";\n")
+            fh.write("\n-- Insert the questionnaire into the questionnaires table\n")
+            fh.write(f"INSERT INTO {TABLE} (\n  " + ",\n  ".join(COPY_COLUMNS) + "\n)\nVALUES (\n")
+        else:
+            fh.write(", (\n")
+        fh.write(f"  {sql_string(variant.title)},\n  {sql_string(variant.description)},\n  '")
+        names = _write_sections_json(iter_sections(variant.questions, variant.unit_mapping),
+                                     write, indent=2, prefix="  ")
+        fh.write("',\n  '")
+        write(_section_names_json(names, indent=2, prefix="  "))
+        fh.write("',\n  current_timestamp,\n  current_timestamp\n)")
+        rows += 1
+    if rows:
+        fh.write(";\n")
+    return rows
+
+
+def write_copy(fh, variants):
+    """Write a ``COPY ... FROM STDIN`` block (text format) loading every variant.
+
+    Timestamps are written as ``now`` so PostgreSQL stamps each row with the
+    load transaction's time. Returns the number of rows written.
+    """
+    def write(chunk):
+        fh.write(chunk.translate(_COPY_ESCAPES))
+
+    fh.write(f"COPY {TABLE} ({', '.join(COPY_COLUMNS)}) FROM STDIN;\n")
+    rows = 0
+    for variant in variants:
+        fh.write(copy_field(variant.title) + "\t" + copy_field(variant.description) + "\t")
+        names = _write_sections_json(iter_sections(variant.questions, variant.unit_mapping), write)
+        fh.write("\t" + copy_field(_section_names_json(names)) + "\tnow\tnow\n")
+        rows += 1
+    fh.write("\\.\n")
+    return rows
@@ -0,0 +1,172 @@
+"""Streaming helpers for emitting the questionnaire section by section.
+
+The in-memory path in new-questionaire.py builds the whole nested structure
+before printing it. For large catalogs the functions below read questions
+lazily, group them in a single pass and write every section as soon as it is
+complete, so peak memory is bounded by the largest section.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+
+# Keys kept in the questionnaire output (guidance fields are dropped unless
+# asked for).
+OUTPUT_KEYS = ("question_id", "question_text", "question_type", "options", "required")
+GUIDANCE_KEYS = ("calculation_method", "example")
+
+COMPACT_SEPARATORS = (",", ":")
+
+
+class NonContiguousSectionError(ValueError):
+    """Raised when a section reappears after another section has started."""
+
+    def __init__(self, section):
+        super().__init__(f"Section {section!r} is not contiguous in the input")
+        self.section = section
+
+
+def to_output_question(question, unit_mapping, guidance=False):
+    """Return the output form of a flat question row.
+
+    With ``guidance`` the ``calculation_method`` and ``example`` fields are kept.
+    """
+    new_question = {key: question.get(key) for key in OUTPUT_KEYS}
+    new_question["required"] = bool(new_question["required"])
+    # For number type questions, add a unit. A unit carried on the row itself
+    # wins over the mapping.
+    if question["question_type"] == "number":
+        if "unit" in question:
+            new_question["unit"] = question["unit"]
+        else:
+            new_question["unit"] = unit_mapping.get(question["question_id"])
+    if guidance:
+        for key in GUIDANCE_KEYS:
+            new_question[key] = question.get(key)
+    return new_question
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _parse_csv_row(row):
+    # CSV cells are all strings; options are stored as a JSON list and
+    # empty cells stand for null.
+    question = {key: (value if value != "" else None) for key, value in row.items()}
+    if question.get("options"):
+        question["options"] = json.loads(question["options"])
+    question["required"] = str(question.get("required") or "").strip().lower() in ("1", "true", "yes")
+    if "unit" in question and question["unit"] is None:
+        del question["unit"]
+    return question
+
+
+def read_questions(path):
+    """Lazily yield flat question rows from a JSONL or CSV file (optionally .gz)."""
+    name = path[:-3] if path.endswith(".gz") else path
+    _, ext = os.path.splitext(name)
+    with _open_text(path) as fh:
+        if ext == ".csv":
+            for row in csv.DictReader(fh):
+                yield _parse_csv_row(row)
+        elif ext in (".jsonl", ".ndjson"):
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported question source format: {path}")
+
+
+def check_contiguous(questions):
+    """Raise NonContiguousSectionError unless every section's rows are contiguous.
+
+    Lets callers holding the rows in memory fail before any output is written.
+    """
+    seen = set()
+    current_name = None
+    for question in questions:
+        section_name = question["section"]
+        if section_name != current_name:
+            if section_name in seen:
+                raise NonContiguousSectionError(section_name)
+            seen.add(section_name)
+            current_name = section_name
+
+
+def iter_sections(questions, unit_mapping, guidance=False):
+    """Group questions by section in one pass, yielding each finished section.
+
+    Questions of a section must be contiguous in the input, which is how the
+    catalog is authored. A section that reappears after another one started
+    raises NonContiguousSectionError instead of being silently split in two.
+    """
+    seen = set()
+    current_name = None
+    current_questions = []
+    for question in questions:
+        section_name = question["section"]
+        if section_name != current_name:
+            if current_name is not None:
+                yield {"section": current_name, "questions": current_questions}
+            if section_name in seen:
+                raise NonContiguousSectionError(section_name)
+            seen.add(section_name)
+            current_name = section_name
+            current_questions = []
+        current_questions.append(to_output_question(question, unit_mapping, guidance))
+    if current_name is not None:
+        yield {"section": current_name, "questions": current_questions}
+
+
+def write_sections(sections, fh, fmt="json"):
+    """Write sections to a text file handle as they arrive.
+
+    ``json`` writes one compact ``{"sections": [...]}`` document, ``ndjson``
+    writes one section object per line. Returns the number of sections written.
+    """
+    count = 0
+    if fmt == "json":
+        fh.write('{"sections":[')
+        for section in sections:
+            if count:
+                fh.write(",")
+            fh.write(json.dumps(section, ensure_ascii=False, separators=COMPACT_SEPARATORS))
+            count += 1
+        fh.write("]}\n")
+    elif fmt == "ndjson":
+        for section in sections:
+            fh.write(json.dumps(section, ensure_ascii=False, separators=COMPACT_SEPARATORS))
+            fh.write("\n")
+            count += 1
+    else:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    return count
+
+
+def open_output(path=None, compress=False, stdout=None):
+    """Open a text output handle, gzip-compressed when requested or for .gz paths."""
+    compress = compress or (path is not None and path.endswith(".gz"))
+    if path is None:
+        if compress:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=stdout.buffer, mode="wb"), encoding="utf-8")
+        return _NonClosing(stdout)
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+class _NonClosing:
+    # Context manager around stdout that flushes instead of closing it.
+    def __init__(self, fh):
+        self.fh = fh
+
+    def __enter__(self):
+        return self.fh
+
+    def __exit__(self, *exc):
+        self.fh.flush()
+        return False
@@ -0,0 +1,335 @@
+"""Columnar analytics over exported ``responses.answers``.
+
+``load_responses`` reads a responses dump (JSONL or CSV, optionally .gz) in
+one pass into a ``ResponseColumns`` table: one float64 column per ``number``
+question of a compiled catalog plus a presence mask, and per-row company,
+year and sector keys. Cohort statistics are then computed in batch with NumPy
+instead of looping over answer dicts.
+
+Usage::
+
+    python new-questionaire.py --compile catalog.bin
+    python response_analytics.py responses.jsonl --catalog catalog.bin
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from questionnaire_catalog import Catalog
+from response_io import byte_ranges, iter_jsonl_range, iter_response_rows, parse_number
+
+SECTOR_QUESTION = "industry-sector"
+TURNOVER_QUESTION = "annual-turnover"
+EMISSIONS_QUESTIONS = ("scope1-emissions", "scope2-emissions", "scope3-emissions")
+
+
+class ResponseColumns:
+    """Numeric answers of many responses as column arrays.
+
+    ``values[:, j]`` holds the answers to ``question_ids[j]`` (NaN where
+    missing) and ``present[:, j]`` marks which of them were answered with a
+    parseable number. Only questions answered somewhere in the dump get a
+    column, so a catalog of hundreds of thousands of questions costs nothing
+    for the ones nobody answered. ``years`` is 0 where the row has no year;
+    ``invalid_years`` lists the response ids whose year could not be parsed.
+    """
+
+    def __init__(self, response_ids, company_keys, companies, years, sectors, sector_codes, question_ids,
+                 values, present, invalid_years=None):
+        self.response_ids = response_ids
+        self.company_keys = company_keys
+        self.companies = companies
+        self.years = years
+        self.sectors = sectors
+        self.sector_codes = sector_codes
+        self.question_ids = question_ids
+        self.values = values
+        self.present = present
+        self.invalid_years = list(invalid_years or ())
+        self._columns = {question_id: j for j, question_id in enumerate(question_ids)}
+
+    def __len__(self):
+        return len(self.response_ids)
+
+    def column(self, question_id):
+        """Return ``(values, present)`` for one question.
+
+        These are views for answered questions; a question without a column
+        gets an all-NaN column.
+        """
+        j = self._columns.get(question_id)
+        if j is None:
+            return np.full(len(self), np.nan), np.zeros(len(self), dtype=bool)
+        return self.values[:, j], self.present[:, j]
+
+    @classmethod
+    def from_rows(cls, rows, question_ids):
+        """Build columns from response rows in a single pass.
+
+        Only answered numeric questions are touched per row; they are
+        collected as (row, column, value) triples and scattered into the
+        value matrix at the end, which has a column only for the questions of
+        ``question_ids`` that were answered with a number at least once.
+        """
+        question_ids = list(question_ids)
+        column_of = {question_id: j for j, question_id in enumerate(question_ids)}
+        response_ids, companies, years, sector_codes, invalid_years = [], [], [], [], []
+        company_codes, sector_index = {}, {}
+        hit_rows, hit_columns, hit_values = [], [], []
+        for i, row in enumerate(rows):
+            answers = row["answers"]
+            response_ids.append(row.get("id"))
+            company = row.get("user_id") or row.get("id")
+            companies.append(company_codes.setdefault(company, len(company_codes)))
+            year = row.get("year") or str(row.get("created_at") or "")[:4]
+            try:
+                years.append(int(year) if year else 0)
+            except (TypeError, ValueError):
+                # e.g. "FY24": kept, but left out of year-over-year comparisons.
+                years.append(0)
+                invalid_years.append(row.get("id"))
+            sector = answers.get(SECTOR_QUESTION)
+            sector = sector.strip() if isinstance(sector, str) else ""
+            sector_codes.append(sector_index.setdefault(sector, len(sector_index)))
+            for question_id, value in answers.items():
+                j = column_of.get(question_id)
+                if j is None or value is None or value is True or value is False:
+                    continue
+                try:
+                    number = float(value)
+                except (TypeError, ValueError):
+                    number = parse_number(value)
+                    if number is None:
+                        continue
+                hit_rows.append(i)
+                hit_columns.append(j)
+                hit_values.append(number)
+
+        hit_columns = np.array(hit_columns, dtype=np.int64)
+        answered = np.unique(hit_columns)
+        values = np.full((len(response_ids), len(answered)), np.nan)
+        values[np.array(hit_rows, dtype=np.int64), np.searchsorted(answered, hit_columns)] = hit_values
+        # Number sectors alphabetically so the output order is stable.
+        sectors = sorted(sector_index)
+        remap = np.empty(len(sectors), dtype=np.int64)
+        remap[[sector_index[name] for name in sectors]] = np.arange(len(sectors))
+        return cls(
+            response_ids=np.array(response_ids, dtype=object),
+            company_keys=list(company_codes),
+            companies=np.array(companies, dtype=np.int64),
+            years=np.array(years, dtype=np.int32),
+            sectors=[name or None for name in sectors],
+            sector_codes=remap[np.array(sector_codes, dtype=np.int64)],
+            question_ids=[question_ids[j] for j in answered.tolist()],
+            values=values,
+            present=~np.isnan(values),
+            invalid_years=invalid_years,
+        )
+
+    @classmethod
+    def concat(cls, parts, question_ids=None):
+        """Stack column tables, re-coding companies and sectors.
+
+        The result has a column for every question answered in any part,
+        ordered as in ``question_ids`` (or by first appearance).
+        """
+        order = {}
+        for question_id in question_ids or ():
+            order.setdefault(question_id, len(order))
+        for part in parts:
+            for question_id in part.question_ids:
+                order.setdefault(question_id, len(order))
+        answered = sorted({question_id for part in parts for question_id in part.question_ids}, key=order.get)
+        company_codes, sector_names = {}, set()
+        for part in parts:
+            for key in part.company_keys:
+                company_codes.setdefault(key, len(company_codes))
+            sector_names.update(part.sectors)
+        sectors = sorted(sector_names, key=lambda name: name or "")
+        sector_codes = {name: code for code, name in enumerate(sectors)}
+
+        def recode(codes, keys, mapping):
+            table = np.array([mapping[key] for key in keys], dtype=np.int64)
+            return table[codes] if len(table) else codes
+
+        column_of = {question_id: j for j, question_id in enumerate(answered)}
+        values = np.full((sum(len(part) for part in parts), len(answered)), np.nan)
+        start = 0
+        for part in parts:
+            values[start:start + len(part), [column_of[q] for q in part.question_ids]] = part.values
+            start += len(part)
+        return cls(
+            response_ids=np.concatenate([part.response_ids for part in parts]),
+            company_keys=list(company_codes),
+            companies=np.concatenate([recode(part.companies, part.company_keys, company_codes) for part in parts]),
+            years=np.concatenate([part.years for part in parts]),
+            sectors=sectors,
+            sector_codes=np.concatenate([recode(part.sector_codes, part.sectors, sector_codes) for part in parts]),
+            question_ids=answered,
+            values=values,
+            present=~np.isnan(values),
+            invalid_years=[response_id for part in parts for response_id in part.invalid_years],
+        )
+
+
+def _load_range(args):
+    path, start, end, question_ids = args
+    return ResponseColumns.from_rows(iter_jsonl_range(path, start, end), question_ids)
+
+
+def load_responses(path, catalog, workers=1, question_ids=None):
+    """Read a responses dump into columns for the ``number`` questions of ``catalog``.
+
+    ``question_ids`` restricts the columns to a subset of those questions.
+
+    With ``workers > 1`` an uncompressed JSONL dump is split into line-aligned
+    byte ranges that are parsed in a process pool, since JSON decoding
+    dominates the load time. Other formats are always read in one process.
+    """
+    numeric = catalog.question_ids("number")
+    if question_ids is not None:
+        wanted = set(question_ids)
+        unknown = wanted.difference(numeric)
+        if unknown:
+            raise ValueError(f"Not number questions of the catalog: {', '.join(sorted(unknown))}")
+        numeric = [question_id for question_id in numeric if question_id in wanted]
+    question_ids = numeric
+    if workers > 1 and os.path.splitext(path)[1] in (".jsonl", ".ndjson"):
+        ranges = byte_ranges(path, workers)
+        if len(ranges) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_load_range, [(path, start, end, question_ids) for start, end in ranges]))
+            return ResponseColumns.concat(parts, question_ids)
+    return ResponseColumns.from_rows(iter_response_rows(path), question_ids)
+
+
+def _grouped_percentiles(codes, values, n_groups, percentiles):
+    # Linear-interpolation percentiles (numpy's default method) for every
+    # group at once: sort by (group, value), then index into each group's run.
+    keep = ~np.isnan(values)
+    codes, values = codes[keep], values[keep]
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    fractions = np.asarray(percentiles, dtype=np.float64) / 100.0
+    positions = starts[:, None] + fractions[None, :] * np.maximum(counts - 1, 0)[:, None]
+    low = np.floor(positions).astype(np.int64)
+    high = np.ceil(positions).astype(np.int64)
+    result = np.full((n_groups, len(fractions)), np.nan)
+    has_values = counts > 0
+    if has_values.any():
+        low, high, positions = low[has_values], high[has_values], positions[has_values]
+        result[has_values] = values[low] + (values[high] - values[low]) * (positions - low)
+    return result, counts
+
+
+def sector_percentiles(columns, values, percentiles=(25, 50, 75)):
+    """Return ``{sector: {"count": n, "p25": ..., ...}}`` for a value column.
+
+    ``values`` is either a question_id or an array aligned with the rows
+    (e.g. the output of ``emissions_intensity``). Missing values are ignored.
+    """
+    if isinstance(values, str):
+        values = columns.column(values)[0]
+    table, counts = _grouped_percentiles(columns.sector_codes, values, len(columns.sectors), percentiles)
+    return {
+        sector: dict({"count": int(counts[i])},
+                     **{f"p{p:g}": (None if np.isnan(v) else float(v)) for p, v in zip(percentiles, table[i])})
+        for i, sector in enumerate(columns.sectors)
+    }
+
+
+def emissions_intensity(columns, emissions=EMISSIONS_QUESTIONS, denominator=TURNOVER_QUESTION):
+    """Total reported emissions divided by ``denominator`` for every row.
+
+    Emissions questions that were not answered count as zero as long as at
+    least one was answered (Scope 3 is optional). Rows without emissions or
+    with a missing or non-positive denominator are NaN.
+    """
+    emitted = [columns.column(question_id) for question_id in emissions]
+    present = np.column_stack([column[1] for column in emitted])
+    total = np.column_stack([np.where(column[1], column[0], 0.0) for column in emitted]).sum(axis=1)
+    divisor, divisor_present = columns.column(denominator)
+    valid = present.any(axis=1) & divisor_present & (divisor > 0)
+    result = np.full(len(columns), np.nan)
+    np.divide(total, divisor, out=result, where=valid)
+    return result
+
+
+def year_over_year(columns, values):
+    """Change of a value against the same company's previous calendar year.
+
+    Returns ``(delta, ratio)`` arrays aligned with the rows, where ``ratio`` is
+    ``delta / previous``. When a company answered several times in one year,
+    its last response in the dump is used and the others are NaN.
+    """
+    if isinstance(values, str):
+        values = columns.column(values)[0]
+    n = len(columns)
+    order = np.lexsort((np.arange(n), columns.years, columns.companies))
+    companies, years, ordered = columns.companies[order], columns.years[order], values[order]
+    # Keep the last row of every (company, year) run.
+    last = np.ones(n, dtype=bool)
+    last[:-1] = (companies[1:] != companies[:-1]) | (years[1:] != years[:-1])
+    rows, companies, years, ordered = order[last], companies[last], years[last], ordered[last]
+
+    delta = np.full(n, np.nan)
+    ratio = np.full(n, np.nan)
+    if len(rows) > 1:
+        follows = (companies[1:] == companies[:-1]) & (years[1:] == years[:-1] + 1)
+        previous, current = ordered[:-1], ordered[1:]
+        changed = current - previous
+        delta[rows[1:][follows]] = changed[follows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative = np.where(previous != 0, changed / previous, np.nan)
+        ratio[rows[1:][follows]] = relative[follows]
+    return delta, ratio
+
+
+def summarize(columns, percentiles=(25, 50, 75)):
+    """Sector percentiles for every answered number question plus emissions intensity."""
+    summary = {
+        "responses": len(columns),
+        "invalid_years": len(columns.invalid_years),
+        "questions": {question_id: sector_percentiles(columns, question_id, percentiles)
+                      for question_id in columns.question_ids},
+    }
+    answered = set(columns.question_ids)
+    if TURNOVER_QUESTION in answered and answered.intersection(EMISSIONS_QUESTIONS):
+        summary["emissions_intensity"] = sector_percentiles(columns, emissions_intensity(columns), percentiles)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cohort statistics over a responses dump.")
+    parser.add_argument("responses", help="Responses dump (.jsonl or .csv, optionally .gz).")
+    parser.add_argument("--catalog", required=True, help="Compiled catalog from new-questionaire.py --compile.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used to parse an uncompressed JSONL dump.")
+    parser.add_argument("--percentiles", default="25,50,75", help="Comma-separated percentiles.")
+    parser.add_argument("--questions",
+                        help="Comma-separated number question_ids to analyse (defaults to every answered one).")
+    args = parser.parse_args(argv)
+
+    catalog = Catalog.load(args.catalog)
+    question_ids = args.questions.split(",") if args.questions else None
+    try:
+        columns = load_responses(args.responses, catalog, workers=args.workers, question_ids=question_ids)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if columns.invalid_years:
+        print(f"warning: {len(columns.invalid_years)} response(s) with an unparseable year, left out of "
+              f"year-over-year comparisons (e.g. {', '.join(map(str, columns.invalid_years[:5]))})",
+              file=sys.stderr)
+    percentiles = tuple(float(p) for p in args.percentiles.split(","))
+    json.dump(summarize(columns, percentiles), sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
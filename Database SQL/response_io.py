@@ -0,0 +1,92 @@
+"""Reading exported ``responses`` dumps.
+
+Shared by the analytics and validation tools: rows come from JSONL or CSV
+(optionally .gz) exports of the ``responses`` table, with ``answers`` either
+an object or a JSON string. ``byte_ranges`` and ``iter_jsonl_range`` let a
+process pool split an uncompressed JSONL dump between workers.
+"""
+import csv
+import gzip
+import json
+import os
+
+_NUMBER_JUNK = str.maketrans("", "", "  %€$£")
+
+
+def parse_number(value):
+    """Parse a numeric answer, returning None when it is not a number.
+
+    Accepts numbers and strings such as ``"40%"``, ``"€0.15"``, ``"1,500"``
+    (thousands separator) or ``"0,5"`` (decimal comma).
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    text = str(value).translate(_NUMBER_JUNK)
+    if "," in text:
+        if "." in text or text.count(",") > 1:
+            text = text.replace(",", "")
+        else:
+            head, _, tail = text.partition(",")
+            text = head + ("" if len(tail) == 3 else ".") + tail
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def iter_response_rows(path):
+    """Yield response rows (dicts with a decoded ``answers`` dict) from a dump."""
+    name = path[:-3] if path.endswith(".gz") else path
+    ext = os.path.splitext(name)[1]
+    with _open_text(path) as fh:
+        if ext == ".csv":
+            rows = csv.DictReader(fh)
+        elif ext in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in fh if line.strip())
+        else:
+            raise ValueError(f"Unsupported responses format: {path}")
+        for row in rows:
+            answers = row.get("answers")
+            if isinstance(answers, str):
+                row["answers"] = json.loads(answers) if answers else {}
+            elif answers is None:
+                row["answers"] = {}
+            yield row
+
+
+def byte_ranges(path, parts):
+    """Split a file into at most ``parts`` byte ranges aligned on line breaks."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as fh:
+        for k in range(1, parts):
+            fh.seek(max(size * k // parts, bounds[-1]))
+            fh.readline()
+            bounds.append(min(fh.tell(), size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def iter_jsonl_range(path, start, end):
+    """Yield decoded response rows from one ``byte_ranges`` range of a JSONL dump."""
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while fh.tell() < end:
+            line = fh.readline()
+            if line.strip():
+                row = json.loads(line)
+                answers = row.get("answers")
+                row["answers"] = json.loads(answers) if isinstance(answers, str) else (answers or {})
+                yield row
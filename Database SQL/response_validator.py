@@ -0,0 +1,255 @@
+"""Batch validation of ``responses.answers`` against the questionnaire catalog.
+
+Every question of a compiled catalog is turned into an ``accepted`` set and a
+``check`` function. ``accepted`` is a precomputed set of values known to be valid: the
+options of a select question, the spellings of yes/no for a boolean, and a
+bounded memo of number answers that already passed. Most answers are settled
+by that single set lookup, and only the rest call ``check``, which returns an
+error code or None.
+
+Usage::
+
+    python response_validator.py responses.jsonl --catalog catalog.bin --workers 8
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from questionnaire_catalog import Catalog
+from response_io import byte_ranges, iter_jsonl_range, iter_response_rows, parse_number
+
+MISSING = "missing"
+NOT_A_NUMBER = "not_a_number"
+OUT_OF_RANGE = "out_of_range"
+NOT_BOOLEAN = "not_boolean"
+NOT_AN_OPTION = "not_an_option"
+NOT_TEXT = "not_text"
+UNKNOWN_QUESTION = "unknown_question"
+
+TRUE_VALUES = ("Yes", "yes", "YES", "true", "True", "TRUE", "1", True)
+FALSE_VALUES = ("No", "no", "NO", "false", "False", "FALSE", "0", False)
+
+# Number answers are non-negative and percentages are capped at 100, except
+# where the question allows otherwise.
+RANGE_OVERRIDES = {
+    "year-of-establishment": (1800, None),
+    "energy-consumption-reduction": (None, 100),
+    "supply-chain-emissions-reduction": (None, 100),
+}
+
+# Upper bound for the per-question memo of number answers that passed.
+NUMBER_MEMO_SIZE = 4096
+
+
+def coerce_boolean(value):
+    """Return True/False for a yes/no style answer, None if it is not one.
+
+    Numbers are not yes/no answers: 1 and 0 compare equal to True and False
+    but are rejected, since the form stores either strings or JSON booleans.
+    """
+    if value.__class__ is bool:
+        return value
+    if isinstance(value, str):
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+    return None
+
+
+def default_range(question_id, unit):
+    """Return the ``(low, high)`` bounds applied to a number question."""
+    if question_id in RANGE_OVERRIDES:
+        return RANGE_OVERRIDES[question_id]
+    return (0, 100) if unit == "%" else (0, None)
+
+
+def _number_check(low, high, memo):
+    low = -math.inf if low is None else low
+    high = math.inf if high is None else high
+
+    def check(value):
+        number = parse_number(value)
+        if number is None or not math.isfinite(number):
+            return NOT_A_NUMBER
+        if not low <= number <= high:
+            return OUT_OF_RANGE
+        # Only strings are memoized: 1 == True would let booleans through.
+        if type(value) is str and len(memo) < NUMBER_MEMO_SIZE:
+            memo.add(value)
+        return None
+    return check
+
+
+def _boolean_check(value):
+    return None if coerce_boolean(value) is not None else NOT_BOOLEAN
+
+
+def _option_check(value):
+    return NOT_AN_OPTION
+
+
+def _text_check(value):
+    return None if isinstance(value, str) else NOT_TEXT
+
+
+class ValidationReport:
+    """Error counts and offending response ids per question."""
+
+    def __init__(self, max_offenders=1000):
+        self.max_offenders = max_offenders
+        self.responses = 0
+        self.invalid_responses = 0
+        self.error_counts = {}
+        self.offenders = {}
+
+    def add(self, response_id, question_id, error):
+        self.error_counts.setdefault(question_id, Counter())[error] += 1
+        offenders = self.offenders.setdefault(question_id, [])
+        if len(offenders) < self.max_offenders:
+            offenders.append(response_id)
+
+    def merge(self, other):
+        """Fold another report (e.g. from a pool worker) into this one."""
+        self.responses += other.responses
+        self.invalid_responses += other.invalid_responses
+        for question_id, counts in other.error_counts.items():
+            self.error_counts.setdefault(question_id, Counter()).update(counts)
+        for question_id, offenders in other.offenders.items():
+            merged = self.offenders.setdefault(question_id, [])
+            merged.extend(offenders[:self.max_offenders - len(merged)])
+        return self
+
+    def as_dict(self):
+        return {
+            "responses": self.responses,
+            "invalid_responses": self.invalid_responses,
+            "errors": {question_id: dict(counts) for question_id, counts in self.error_counts.items()},
+            "offenders": self.offenders,
+        }
+
+
+class ResponseValidator:
+    """Validator compiled from a catalog's question_type, options and required fields."""
+
+    def __init__(self, definitions, ranges=None):
+        # ``definitions`` are (question_id, question_type, options, required,
+        # unit) tuples; they are what gets pickled for pool workers.
+        self._definitions = list(definitions)
+        self._ranges = dict(ranges or {})
+        self.accepted = {}
+        self.checks = {}
+        self.required = frozenset(d[0] for d in self._definitions if d[3])
+        for question_id, question_type, options, required, unit in self._definitions:
+            # Blank answers pass here; required questions are checked separately.
+            blank = ("", None)
+            if question_type == "number":
+                memo = set(blank)
+                low, high = self._ranges.get(question_id) or default_range(question_id, unit)
+                self.accepted[question_id] = memo
+                self.checks[question_id] = _number_check(low, high, memo)
+            elif question_type == "boolean":
+                # Strings only: True/False in the set would also admit 1 and 0,
+                # so JSON booleans go through the check.
+                self.accepted[question_id] = frozenset(
+                    value for value in TRUE_VALUES + FALSE_VALUES + blank if not isinstance(value, bool))
+                self.checks[question_id] = _boolean_check
+            elif question_type == "select":
+                self.accepted[question_id] = frozenset(tuple(options or ()) + blank)
+                self.checks[question_id] = _option_check
+            else:
+                self.accepted[question_id] = frozenset(blank)
+                self.checks[question_id] = _text_check
+        # Any string is a valid text answer; checked inline in validate().
+        self.text_questions = frozenset(d[0] for d in self._definitions
+                                        if d[1] not in ("number", "boolean", "select"))
+
+    @classmethod
+    def from_catalog(cls, catalog, ranges=None):
+        return cls(((q.question_id, q.question_type, q.options, q.required, q.unit) for q in catalog), ranges)
+
+    def __reduce__(self):
+        return (type(self), (self._definitions, self._ranges))
+
+    def validate(self, answers):
+        """Return a list of ``(question_id, error)`` for one answers dict."""
+        errors = []
+        accepted, texts = self.accepted, self.text_questions
+        for question_id, value in answers.items():
+            try:
+                if value in accepted[question_id] or (question_id in texts and value.__class__ is str):
+                    continue
+            except KeyError:
+                errors.append((question_id, UNKNOWN_QUESTION))
+                continue
+            except TypeError:
+                # Unhashable answers (lists, objects) go to the full check.
+                pass
+            error = self.checks[question_id](value)
+            if error is not None:
+                errors.append((question_id, error))
+        if self.required:
+            for question_id in self.required:
+                if answers.get(question_id) in (None, ""):
+                    errors.append((question_id, MISSING))
+        return errors
+
+    def validate_batch(self, rows, report=None):
+        """Validate response rows (dicts with ``id`` and ``answers``) into a report."""
+        report = report or ValidationReport()
+        validate = self.validate
+        responses = invalid = 0
+        for row in rows:
+            responses += 1
+            errors = validate(row["answers"])
+            if errors:
+                invalid += 1
+                response_id = row.get("id")
+                for question_id, error in errors:
+                    report.add(response_id, question_id, error)
+        report.responses += responses
+        report.invalid_responses += invalid
+        return report
+
+
+def _validate_range(args):
+    validator, path, start, end, max_offenders = args
+    return validator.validate_batch(iter_jsonl_range(path, start, end), ValidationReport(max_offenders))
+
+
+def validate_file(path, validator, workers=1, max_offenders=1000):
+    """Validate a responses dump, splitting uncompressed JSONL across a process pool."""
+    if workers > 1 and os.path.splitext(path)[1] in (".jsonl", ".ndjson"):
+        ranges = byte_ranges(path, workers)
+        if len(ranges) > 1:
+            report = ValidationReport(max_offenders)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                jobs = [(validator, path, start, end, max_offenders) for start, end in ranges]
+                for part in pool.map(_validate_range, jobs):
+                    report.merge(part)
+            return report
+    return validator.validate_batch(iter_response_rows(path), ValidationReport(max_offenders))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate a responses dump against the questionnaire catalog.")
+    parser.add_argument("responses", help="Responses dump (.jsonl or .csv, optionally .gz).")
+    parser.add_argument("--catalog", required=True, help="Compiled catalog from new-questionaire.py --compile.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes used for an uncompressed JSONL dump (nightly re-validation).")
+    parser.add_argument("--max-offenders", type=int, default=1000,
+                        help="Offending response ids kept per question.")
+    args = parser.parse_args(argv)
+
+    validator = ResponseValidator.from_catalog(Catalog.load(args.catalog))
+    report = validate_file(args.responses, validator, workers=args.workers, max_offenders=args.max_offenders)
+    json.dump(report.as_dict(), sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
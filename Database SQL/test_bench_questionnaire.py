@@ -0,0 +1,15 @@
+"""Smoke run of the response benchmarks on a 1M question catalog.
+
+Run with ``python -m pytest`` from this directory.
+"""
+from bench_questionnaire import run_benchmarks
+
+
+def test_response_benchmarks_run_on_a_million_questions():
+    # analytics/normalize once allocated a column per number question of the
+    # catalog (~400k here) and ran out of memory at this size.
+    results = run_benchmarks([1_000_000], ["analytics", "normalize"], n_responses=1000, repeat=1)
+    for name in ("analytics", "normalize"):
+        result = results[f"{name}@1000000"]
+        assert result["items"] == 1000
+        assert result["peak_bytes"] < 64 * 2 ** 20
@@ -0,0 +1,55 @@
+"""Checks for prompt_fragments: cache reuse across edits and the per-request
+token budget of ReportGenerator.
+
+Run with ``python -m pytest`` from this directory.
+"""
+import pytest
+
+from prompt_fragments import (FragmentStore, FragmentTooLargeError, PromptCompiler, ReportGenerator,
+                              StubModelClient, estimate_tokens)
+
+QUESTIONS = [
+    {"question_id": f"q{s}-{i}", "section": f"Section {s}", "question_text": f"Question {i} of section {s}?",
+     "question_type": "number" if i % 2 else "text", "calculation_method": "Add it up.", "example": "42"}
+    for s in range(3) for i in range(8)
+]
+UNITS = {"q0-1": "kWh"}
+ANSWERS = {question["question_id"]: "An answer of moderate length." for question in QUESTIONS}
+
+
+def _generate(store, answers, token_budget=6000):
+    client = StubModelClient()
+    generator = ReportGenerator(PromptCompiler(QUESTIONS, UNITS), store, client, token_budget=token_budget)
+    report, stats = generator.generate(answers)
+    return report, stats, client
+
+
+def test_only_changed_sections_are_regenerated(tmp_path):
+    store = FragmentStore(str(tmp_path / "fragments.sqlite"))
+    report, stats, _ = _generate(store, ANSWERS)
+    assert (stats["regenerated"], stats["requests"]) == (3, 3)
+    store.close()
+
+    store = FragmentStore(str(tmp_path / "fragments.sqlite"))
+    assert _generate(store, ANSWERS)[:2] == (report, dict(stats, regenerated=0, requests=0, prompt_tokens=0))
+    _, stats, client = _generate(store, dict(ANSWERS, **{"q1-3": "Changed."}))
+    assert (stats["regenerated"], stats["requests"]) == (1, 1)
+    assert "## Section 1" in client.prompts[0]
+
+
+def test_sections_over_the_budget_are_sent_in_parts():
+    store = FragmentStore()
+    report, stats, client = _generate(store, ANSWERS, token_budget=300)
+    assert stats["regenerated"] == 3 and stats["requests"] > 3
+    assert max(estimate_tokens(prompt) for prompt in client.prompts) <= 300
+    # Parts are joined under one header per section.
+    assert [line for line in report.splitlines() if line.startswith("## ")] == [
+        "## Section 0", "## Section 1", "## Section 2"]
+
+
+def test_question_over_the_budget_is_rejected_before_any_request():
+    client = StubModelClient()
+    generator = ReportGenerator(PromptCompiler(QUESTIONS, UNITS), FragmentStore(), client, token_budget=300)
+    with pytest.raises(FragmentTooLargeError, match="'q2-0'"):
+        generator.generate(dict(ANSWERS, **{"q2-0": "x" * 4000}))
+    assert client.prompts == []
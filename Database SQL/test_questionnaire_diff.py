@@ -0,0 +1,137 @@
+"""Checks for questionnaire_diff: random edits replayed through a reference
+RFC 6902 applier, and large reorders that must stay near-linear.
+
+Run with ``python -m pytest`` from this directory.
+"""
+import copy
+import random
+import time
+
+from questionnaire_diff import diff_questionnaires, patch_to_sql
+
+
+def _resolve(document, pointer):
+    tokens = [token.replace("~1", "/").replace("~0", "~") for token in pointer.split("/")[1:]]
+    parent = document
+    for token in tokens[:-1]:
+        parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+    return parent, tokens[-1]
+
+
+def apply_patch(document, ops):
+    """Minimal reference JSON Patch applier (add, remove, replace, move)."""
+    document = copy.deepcopy(document)
+    for op in ops:
+        if op["op"] == "move":
+            parent, token = _resolve(document, op["from"])
+            value = parent.pop(int(token)) if isinstance(parent, list) else parent.pop(token)
+            op = {"op": "add", "path": op["path"], "value": value}
+        parent, token = _resolve(document, op["path"])
+        if op["op"] == "add":
+            if isinstance(parent, list):
+                assert 0 <= int(token) <= len(parent), op
+                parent.insert(int(token), copy.deepcopy(op["value"]))
+            else:
+                parent[token] = copy.deepcopy(op["value"])
+        elif op["op"] == "remove":
+            del parent[int(token) if isinstance(parent, list) else token]
+        elif op["op"] == "replace":
+            index = int(token) if isinstance(parent, list) else token
+            if isinstance(parent, dict):
+                assert index in parent, op
+            parent[index] = copy.deepcopy(op["value"])
+        else:
+            raise AssertionError(f"unexpected op {op}")
+    return document
+
+
+def _document(n_sections, n_questions, prefix="q"):
+    return {"sections": [
+        {"section": f"Section {s}/~{s}", "questions": [
+            {"question_id": f"{prefix}{s}-{i}", "question_text": f"Question {i}?", "question_type": "text",
+             "options": None, "required": False}
+            for i in range(n_questions)]}
+        for s in range(n_sections)]}
+
+
+def _edit(rng, document):
+    document = copy.deepcopy(document)
+    sections = document["sections"]
+    if rng.random() < 0.3:
+        rng.shuffle(sections)
+    if sections and rng.random() < 0.2:
+        sections.pop(rng.randrange(len(sections)))
+    if rng.random() < 0.2:
+        sections.insert(rng.randint(0, len(sections)), {"section": f"New {rng.random()}", "questions": []})
+    for section in sections:
+        questions = section["questions"]
+        for _ in range(rng.randint(0, 3)):
+            if questions:
+                questions.pop(rng.randrange(len(questions)))
+        for _ in range(rng.randint(0, 3)):
+            questions.insert(rng.randint(0, len(questions)),
+                             {"question_id": f"new-{rng.random()}", "question_text": "New?", "required": True})
+        if rng.random() < 0.3:
+            rng.shuffle(questions)
+        elif len(questions) > 1:
+            questions.insert(rng.randrange(len(questions)), questions.pop(rng.randrange(len(questions))))
+        for question in questions:
+            roll = rng.random()
+            if roll < 0.1:
+                question["question_text"] = f"Changed {rng.random()}"
+            elif roll < 0.15:
+                question.pop("options", None)
+            elif roll < 0.2:
+                question["unit"] = "kWh"
+        if rng.random() < 0.1:
+            section["description"] = "Added"
+    return document
+
+
+def test_random_edits_replay_through_reference_applier():
+    rng = random.Random(8)
+    for _ in range(500):
+        old = _document(rng.randint(0, 5), rng.randint(0, 15))
+        new = _edit(rng, old)
+        for max_moves in (None, 2):
+            assert apply_patch(old, diff_questionnaires(old, new, max_moves=max_moves)) == new
+
+
+def test_unchanged_document_has_no_ops():
+    document = _document(3, 10)
+    assert diff_questionnaires(document, copy.deepcopy(document)) == []
+
+
+def test_single_move_is_one_op():
+    old = _document(1, 100)
+    new = copy.deepcopy(old)
+    questions = new["sections"][0]["questions"]
+    questions.insert(10, questions.pop(90))
+    ops = diff_questionnaires(old, new)
+    assert ops == [{"op": "move", "from": "/sections/0/questions/90", "path": "/sections/0/questions/10"}]
+
+
+def test_large_reorder_is_near_linear():
+    # A full reversal moves every item; list index/pop/insert bookkeeping
+    # made this quadratic (tens of seconds at 40k questions).
+    old = _document(1, 40000)
+    new = copy.deepcopy(old)
+    new["sections"][0]["questions"].reverse()
+    started = time.perf_counter()
+    ops = diff_questionnaires(old, new, max_moves=None)
+    assert time.perf_counter() - started < 5
+    assert len(ops) == 39999
+    assert apply_patch(old, ops) == new
+
+
+def test_many_moves_fall_back_to_one_replace():
+    old = _document(2, 200)
+    new = copy.deepcopy(old)
+    new["sections"][1]["questions"].reverse()
+    new["sections"][0]["questions"][0]["question_text"] = "Changed"
+    ops = diff_questionnaires(old, new)
+    assert {"op": "replace", "path": "/sections/1/questions", "value": new["sections"][1]["questions"]} in ops
+    assert not any(op["op"] == "move" for op in ops)
+    assert apply_patch(old, ops) == new
+    sql = patch_to_sql(ops)
+    assert sql.count("UPDATE ") == 1
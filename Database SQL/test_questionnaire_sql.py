@@ -0,0 +1,77 @@
+"""Round-trip checks for the INSERT and COPY output of questionnaire_sql.
+
+Run with ``python -m pytest`` from this directory.
+"""
+import io
+import json
+import re
+import sqlite3
+
+from questionnaire_sql import COPY_COLUMNS, Variant, write_copy, write_insert_sql
+from questionnaire_stream import iter_sections
+
+# Text that exercises every escape: quotes, backslashes, tabs, newlines,
+# carriage returns, a literal "\N" and non-ASCII characters.
+TRICKY = "O'Brien's \"quoted\" \\ back\\slash\ttab\nnewline\r\n \\N CO₂e ünïcode '' end"
+
+QUESTIONS = [
+    {"question_id": "company-name", "section": "Profile", "question_text": TRICKY,
+     "question_type": "text", "options": None, "required": True},
+    {"question_id": "energy", "section": "Profile", "question_text": "Energy use?",
+     "question_type": "number", "options": None, "required": False},
+    {"question_id": "sector", "section": "Sector's \\ section\t2", "question_text": "Sector?",
+     "question_type": "select", "options": ["A'1", "B\\2", "C\n3"], "required": False},
+]
+UNITS = {"energy": "kWh"}
+
+
+def _variants():
+    return [
+        Variant(QUESTIONS, UNITS),
+        Variant(QUESTIONS[:1], UNITS, title=TRICKY, description=None),
+        Variant(QUESTIONS[2:], {}, title="Third", description="It's the third"),
+    ]
+
+
+def _expected(variant):
+    sections = list(iter_sections(variant.questions, variant.unit_mapping))
+    return (variant.title, variant.description, {"sections": sections},
+            {"sections": [section["section"] for section in sections]})
+
+
+def test_insert_sql_loads_into_sqlite():
+    out = io.StringIO()
+    assert write_insert_sql(out, _variants(), batch_size=2) == 3
+    connection = sqlite3.connect(":memory:")
+    connection.execute("ATTACH DATABASE ':memory:' AS public")
+    connection.execute("CREATE TABLE public.questionnaires (id INTEGER PRIMARY KEY, title TEXT, description TEXT,"
+                       " questions TEXT, sections TEXT, created_at TEXT, updated_at TEXT)")
+    connection.executescript(out.getvalue())
+    rows = connection.execute("SELECT title, description, questions, sections, created_at "
+                              "FROM public.questionnaires ORDER BY id").fetchall()
+    assert len(rows) == 3
+    for row, variant in zip(rows, _variants()):
+        assert (row[0], row[1], json.loads(row[2]), json.loads(row[3])) == _expected(variant)
+        assert row[4]
+
+
+def _decode_copy_field(field):
+    if field == "\\N":
+        return None
+    escapes = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\", "b": "\b", "f": "\f", "v": "\v"}
+    return re.sub(r"\\(.)", lambda match: escapes.get(match.group(1), match.group(1)), field)
+
+
+def test_copy_text_round_trips():
+    out = io.StringIO()
+    assert write_copy(out, _variants()) == 3
+    lines = out.getvalue().split("\n")
+    assert lines[0].startswith("COPY public.questionnaires (")
+    assert lines[-2:] == ["\\.", ""]
+    data = lines[1:-2]
+    assert len(data) == 3
+    for line, variant in zip(data, _variants()):
+        fields = [_decode_copy_field(field) for field in line.split("\t")]
+        assert len(fields) == len(COPY_COLUMNS)
+        assert (fields[0], fields[1], json.loads(fields[2]), json.loads(fields[3])) == _expected(variant)
+        assert fields[4:] == ["now", "now"]
@@ -0,0 +1,102 @@
+"""Checks for response_validator: per-type answer checks, required and
+unknown questions, and pool vs single-process reports of ``validate_file``.
+
+Run with ``python -m pytest`` from this directory.
+"""
+import json
+import random
+
+import pytest
+
+from response_validator import (
+    MISSING, NOT_A_NUMBER, NOT_AN_OPTION, NOT_BOOLEAN, NOT_TEXT, OUT_OF_RANGE, UNKNOWN_QUESTION,
+    ResponseValidator, validate_file,
+)
+
+DEFINITIONS = [
+    ("company-name", "text", None, True, None),
+    ("has-policy", "boolean", None, False, None),
+    ("sector", "select", ["Energy", "Retail"], False, None),
+    ("energy", "number", None, False, "kWh"),
+    ("renewable-share", "number", None, False, "%"),
+    ("year-of-establishment", "number", None, False, None),
+]
+
+
+def _errors(answers):
+    return ResponseValidator(DEFINITIONS).validate({"company-name": "Acme", **answers})
+
+
+@pytest.mark.parametrize("value", ["Yes", "no", "TRUE", "false", True, False, "", None])
+def test_boolean_accepts_yes_no(value):
+    assert _errors({"has-policy": value}) == []
+
+
+@pytest.mark.parametrize("value", [1, 0, 1.0, "maybe", ["Yes"]])
+def test_boolean_rejects_numbers_and_others(value):
+    assert _errors({"has-policy": value}) == [("has-policy", NOT_BOOLEAN)]
+
+
+def test_blank_required_answer_is_missing():
+    validator = ResponseValidator(DEFINITIONS)
+    for answers in ({}, {"company-name": ""}, {"company-name": None}):
+        assert validator.validate(answers) == [("company-name", MISSING)]
+
+
+def test_option_membership():
+    assert _errors({"sector": "Energy"}) == []
+    assert _errors({"sector": "energy"}) == [("sector", NOT_AN_OPTION)]
+    assert _errors({"sector": ["Energy"]}) == [("sector", NOT_AN_OPTION)]
+
+
+def test_text_must_be_a_string():
+    assert _errors({"company-name": 7}) == [("company-name", NOT_TEXT)]
+
+
+@pytest.mark.parametrize("question_id, value, error", [
+    ("energy", "1,500", None),
+    ("energy", 1500, None),
+    ("energy", "0,5", None),
+    ("energy", -1, OUT_OF_RANGE),
+    ("energy", "n/a", NOT_A_NUMBER),
+    ("energy", "nan", NOT_A_NUMBER),
+    ("energy", True, NOT_A_NUMBER),
+    ("renewable-share", "40%", None),
+    ("renewable-share", "140%", OUT_OF_RANGE),
+    ("year-of-establishment", 1750, OUT_OF_RANGE),
+    ("year-of-establishment", "1999", None),
+])
+def test_number_parse_and_range(question_id, value, error):
+    expected = [] if error is None else [(question_id, error)]
+    assert _errors({question_id: value}) == expected
+    # A second time goes through the memo of accepted answers.
+    assert _errors({question_id: value}) == expected
+
+
+def test_unknown_question():
+    assert _errors({"not-in-catalog": "x"}) == [("not-in-catalog", UNKNOWN_QUESTION)]
+
+
+def test_validate_file_pool_matches_single_process(tmp_path):
+    rng = random.Random(6)
+    values = {
+        "company-name": ["Acme", "", 7],
+        "has-policy": ["Yes", "No", 1, "maybe"],
+        "sector": ["Energy", "Retail", "Other"],
+        "energy": ["1,500", 12.5, -3, "n/a"],
+        "renewable-share": ["40%", 80, 140],
+        "unknown": ["x"],
+    }
+    path = tmp_path / "responses.jsonl"
+    with open(path, "w", encoding="utf-8") as fh:
+        for i in range(2000):
+            answers = {question_id: rng.choice(choices) for question_id, choices in values.items()
+                       if rng.random() < 0.7}
+            fh.write(json.dumps({"id": f"r{i}", "answers": answers}) + "\n")
+
+    validator = ResponseValidator(DEFINITIONS)
+    single = validate_file(str(path), validator, workers=1).as_dict()
+    pooled = validate_file(str(path), validator, workers=4).as_dict()
+    assert single["responses"] == 2000
+    assert 0 < single["invalid_responses"] < 2000
+    assert pooled == single
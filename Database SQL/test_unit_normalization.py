@@ -0,0 +1,65 @@
+"""Checks for unit_normalization: parsing and factors of the units used in
+``unit_mapping``, ambiguous spellings, and the per-question report of
+``UnitNormalizer.convert_column``.
+
+Run with ``python -m pytest`` from this directory.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from unit_normalization import UnitConversionError, UnitNormalizer, UnitRegistry
+
+
+@pytest.mark.parametrize("from_unit, to_unit, factor", [
+    ("MWh", "kWh", 1000.0),
+    ("kg", "tonnes", 0.001),
+    ("kg CO₂e", "tonnes CO2e", 0.001),
+    ("litres", "cubic meters", 0.001),
+    ("m³", "cubic meters", 1.0),
+    ("incidents per employee", "incidents per 100 employees", 100.0),
+    ("incidents / 100 employees", "incidents per employee", 0.01),
+])
+def test_factors(from_unit, to_unit, factor):
+    assert math.isclose(UnitRegistry().factor(from_unit, to_unit), factor)
+
+
+@pytest.mark.parametrize("unit", ["MT CO2e", "mwh", "MWH"])
+def test_ambiguous_prefix_is_rejected(unit):
+    with pytest.raises(UnitConversionError, match="Ambiguous unit"):
+        UnitRegistry().parse(unit)
+
+
+def test_incompatible_dimensions_are_rejected():
+    registry = UnitRegistry()
+    with pytest.raises(UnitConversionError, match="Cannot convert"):
+        registry.factor("kWh", "tonnes")
+    # Failures are cached and raised again.
+    with pytest.raises(UnitConversionError):
+        registry.factor("kWh", "tonnes")
+
+
+def test_convert_column_with_one_unit():
+    normalizer = UnitNormalizer({"energy": "kWh"})
+    converted = normalizer.convert_column("energy", [1.0, 2.5, np.nan], "MWh")
+    np.testing.assert_array_equal(converted, [1000.0, 2500.0, np.nan])
+    assert normalizer.report == {}
+
+
+def test_convert_column_reports_unconvertible_units_per_question():
+    normalizer = UnitNormalizer({"energy": "kWh", "water": "cubic meters"})
+    energy = normalizer.convert_column("energy", [1.0, 2.0, 3.0, 4.0, np.nan],
+                                       ["MWh", "", "mwh", "tonnes", "tonnes"])
+    np.testing.assert_array_equal(energy, [1000.0, 2.0, np.nan, np.nan, np.nan])
+    water = normalizer.convert_column("water", [500.0, 7.0], "gallons of beer")
+    assert np.isnan(water).all()
+    # Counted by affected (non-missing) values.
+    assert normalizer.report == {"energy": {"mwh": 1, "tonnes": 1}, "water": {"gallons of beer": 2}}
+
+
+def test_unknown_target_unit_passes_values_through():
+    normalizer = UnitNormalizer({"score": "points"})
+    assert "score" in normalizer.unknown_targets
+    np.testing.assert_array_equal(normalizer.convert_column("score", [1.0, 2.0], "kWh"), [1.0, 2.0])
+    assert normalizer.report == {}
@@ -0,0 +1,42 @@
+"""Checks for variant_build: matrix expansion and parameter validation.
+
+Run with ``python -m pytest`` from this directory.
+"""
+import pytest
+
+from variant_build import build_variants, expand_matrix
+
+ROWS = [
+    {"question_id": "a", "section": "S", "question_text": "A?", "question_type": "text", "required": False},
+    {"question_id": "b", "section": "S", "question_text": "B?", "question_type": "text", "required": False,
+     "sectors": ["Retail"]},
+]
+
+
+def test_matrix_names():
+    variants = expand_matrix({"source": "q.{language}.jsonl",
+                              "matrix": {"language": ["en", "de"], "guidance": [False, True]},
+                              "variants": [{"language": "en", "format": "ndjson"}]})
+    assert [variant["name"] for variant in variants] == [
+        "en-all-plain", "en-all-guidance", "de-all-plain", "de-all-guidance", "en-all-plain-ndjson"]
+    assert variants[2]["source"] == "q.de.jsonl"
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"variants": [{"format": "gzip"}]}, "Unknown format 'gzip'"),
+    ({"matrix": {"language": ["en", "de"]}}, "no {language} placeholder"),
+    ({"source": "q.jsonl", "variants": [{"language": "de"}]}, "no {language} placeholder"),
+    ({"source": "q.{lang}.jsonl", "variants": [{"language": "de"}]}, "no {language} placeholder"),
+    ({"source": "q.{region}.jsonl", "variants": [{}]}, "Unknown placeholder"),
+    ({"variants": [{"name": "x"}, {"name": "x", "guidance": True}]}, "Duplicate variant names: x"),
+])
+def test_invalid_specs(spec, message):
+    with pytest.raises(ValueError, match=message.replace("{", r"\{").replace("}", r"\}")):
+        expand_matrix(spec)
+
+
+def test_sector_without_specific_rows_warns(tmp_path):
+    result = build_variants({"matrix": {"sector": [None, "Retail", "Food"]}}, ROWS, {}, str(tmp_path), workers=1)
+    assert result["built"] == ["default-all-plain", "default-retail-plain", "default-food-plain"]
+    assert result["warnings"] == [
+        "variant default-food-plain: sector 'Food' selects no sector-specific rows of the built-in questions"]
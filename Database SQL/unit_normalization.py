@@ -0,0 +1,232 @@
+"""Unit registry and batch conversion driven by ``unit_mapping``.
+
+The units in ``unit_mapping`` are free text ("tonnes CO₂e", "cubic meters",
+"incidents per 100 employees"). ``UnitRegistry`` parses such strings into a
+dimension and a factor to that dimension's base unit, including compound
+units written with ``/`` or ``per`` and numeric multipliers like "per 100
+employees". Conversion factors are computed once per (from, to) pair and
+cached.
+
+``UnitNormalizer`` compiles the target unit of every number question once and
+converts a whole answer column in a single NumPy multiply. Units that cannot
+be converted are collected per question in a report and the affected values
+become NaN, rather than raising in the middle of an ETL run.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+
+# name -> (dimension, factor to the dimension's base unit). Matched after
+# lowercasing, so symbols whose prefix is only told apart by case (m for
+# milli, M for mega) are not listed here but in PREFIXED_UNITS.
+BASE_UNITS = {
+    # mass, base kg
+    "g": ("mass", 0.001), "gram": ("mass", 0.001),
+    "kg": ("mass", 1.0), "kilogram": ("mass", 1.0),
+    "t": ("mass", 1000.0), "tonne": ("mass", 1000.0), "ton": ("mass", 1000.0), "metric ton": ("mass", 1000.0),
+    "kt": ("mass", 1e6), "kilotonne": ("mass", 1e6),
+    "lb": ("mass", 0.45359237), "pound": ("mass", 0.45359237),
+    # greenhouse gas emissions, base kg CO2e
+    "g co2e": ("emissions", 0.001),
+    "kg co2e": ("emissions", 1.0),
+    "t co2e": ("emissions", 1000.0), "tonne co2e": ("emissions", 1000.0), "ton co2e": ("emissions", 1000.0),
+    "kt co2e": ("emissions", 1e6),
+    # energy, base kWh
+    "wh": ("energy", 0.001), "kwh": ("energy", 1.0), "gwh": ("energy", 1e6),
+    "j": ("energy", 1 / 3.6e6), "kj": ("energy", 1 / 3.6e3), "gj": ("energy", 1e3 / 3.6),
+    # power, base kW
+    "w": ("power", 0.001), "kw": ("power", 1.0), "kwp": ("power", 1.0),
+    # volume, base m³
+    "l": ("volume", 0.001), "liter": ("volume", 0.001), "litre": ("volume", 0.001),
+    "m3": ("volume", 1.0), "cubic meter": ("volume", 1.0), "cubic metre": ("volume", 1.0),
+    "megaliter": ("volume", 1000.0), "megalitre": ("volume", 1000.0),
+    "gallon": ("volume", 0.003785411784),
+    # money, base € (no exchange rates: other currencies are not convertible)
+    "€": ("money", 1.0), "eur": ("money", 1.0), "euro": ("money", 1.0),
+    "k€": ("money", 1e3), "keur": ("money", 1e3),
+    # ratio, base %
+    "%": ("ratio", 1.0), "percent": ("ratio", 1.0), "fraction": ("ratio", 100.0),
+    # time, base hour
+    "minute": ("time", 1 / 60), "min": ("time", 1 / 60), "hour": ("time", 1.0), "h": ("time", 1.0),
+    "day": ("time", 24.0),
+    # counts
+    "unit": ("count", 1.0), "unit produced": ("count", 1.0), "item": ("count", 1.0),
+    "incident": ("incident", 1.0),
+    "employee": ("headcount", 1.0), "fte": ("headcount", 1.0),
+}
+
+# Symbols with an m (milli) or M (mega) prefix, matched case-sensitively on
+# the first word; words after it are compared in lowercase. Other spellings,
+# such as "MT CO2e" (often meant as metric tonnes) or "mwh", are rejected as
+# ambiguous instead of guessing a factor 10^6 or 10^9 off.
+PREFIXED_UNITS = {
+    "Mt": ("mass", 1e9), "Mt co2e": ("emissions", 1e9),
+    "mWh": ("energy", 1e-6), "MWh": ("energy", 1e3),
+    "mJ": ("energy", 1 / 3.6e9), "MJ": ("energy", 1 / 3.6),
+    "mW": ("power", 1e-6), "MW": ("power", 1e3), "MWp": ("power", 1e3),
+    "ml": ("volume", 1e-6), "mL": ("volume", 1e-6), "Ml": ("volume", 1000.0), "ML": ("volume", 1000.0),
+    "M€": ("money", 1e6), "MEUR": ("money", 1e6),
+}
+
+_SPELLINGS = (
+    ("₂", "2"), ("co2-eq", "co2e"), ("co2eq", "co2e"), ("co2 e", "co2e"), ("m³", "m3"),
+    ("euros", "euro"), ("per cent", "percent"),
+)
+_SPELLING_RE = re.compile("|".join(re.escape(old) for old, _ in _SPELLINGS), re.IGNORECASE)
+_SPELLING_MAP = dict(_SPELLINGS)
+_PER = re.compile(r"\s*/\s*|\s+per\s+", re.IGNORECASE)
+_TERM = re.compile(r"^(?:(\d+(?:\.\d+)?)\s*)?(.+?)$")
+
+
+class UnitConversionError(ValueError):
+    """Raised when a unit is unknown or two units are not convertible."""
+
+
+class UnitRegistry:
+    """Parses unit strings and serves cached conversion factors."""
+
+    def __init__(self, units=None, prefixed=None):
+        self.units = dict(BASE_UNITS if units is None else units)
+        self.prefixed = dict(PREFIXED_UNITS if prefixed is None else prefixed)
+        self._ambiguous = {key.lower() for key in self.prefixed}
+        self._parsed = {}
+        self._factors = {}
+
+    def _lookup(self, name):
+        # Accept plurals on the last word ("tonnes", "cubic meters") or the
+        # first one ("tonnes co2e", "units produced").
+        candidates = [name]
+        if name.endswith("s"):
+            candidates.append(name[:-1])
+        first, _, rest = name.partition(" ")
+        if rest and first.endswith("s"):
+            candidates.append(first[:-1] + " " + rest)
+        for candidate in candidates:
+            if candidate in self.units:
+                return self.units[candidate]
+        raise UnitConversionError(f"Unknown unit {name!r}")
+
+    def _parse_term(self, term):
+        number, name = _TERM.match(term.strip()).groups()
+        first, _, rest = name.strip().partition(" ")
+        prefixed = self.prefixed.get(first + " " + rest.lower() if rest else first)
+        if prefixed is None:
+            name = name.strip().lower()
+            if name in self._ambiguous and name not in self.units:
+                raise UnitConversionError(f"Ambiguous unit {term.strip()!r}: the prefix is case-sensitive "
+                                          f"(m for milli, M for mega)")
+        dimension, factor = prefixed or self._lookup(name)
+        return dimension, factor * (float(number) if number else 1.0)
+
+    def parse(self, unit):
+        """Return ``(dimension, factor)`` for a unit string, caching the result.
+
+        Compound units give a ``"numerator/denominator"`` dimension.
+        """
+        parsed = self._parsed.get(unit)
+        if parsed is None:
+            text = _SPELLING_RE.sub(lambda match: _SPELLING_MAP[match.group(0).lower()], unit.strip())
+            terms = _PER.split(text, maxsplit=1)
+            dimension, factor = self._parse_term(terms[0])
+            if len(terms) == 2:
+                per_dimension, per_factor = self._parse_term(terms[1])
+                dimension, factor = f"{dimension}/{per_dimension}", factor / per_factor
+            parsed = self._parsed[unit] = (dimension, factor)
+        return parsed
+
+    def factor(self, from_unit, to_unit):
+        """Multiplier converting values in ``from_unit`` to ``to_unit``."""
+        key = (from_unit, to_unit)
+        factor = self._factors.get(key)
+        if factor is None:
+            # Failures are cached too, so a bad unit is only parsed once.
+            try:
+                factor = self._compute_factor(from_unit, to_unit)
+            except UnitConversionError as exc:
+                factor = exc
+            self._factors[key] = factor
+        if isinstance(factor, UnitConversionError):
+            raise factor
+        return factor
+
+    def _compute_factor(self, from_unit, to_unit):
+        if from_unit == to_unit:
+            return 1.0
+        from_dimension, from_factor = self.parse(from_unit)
+        to_dimension, to_factor = self.parse(to_unit)
+        if from_dimension != to_dimension:
+            raise UnitConversionError(f"Cannot convert {from_unit!r} ({from_dimension}) "
+                                      f"to {to_unit!r} ({to_dimension})")
+        return from_factor / to_factor
+
+
+class UnitNormalizer:
+    """Converts answer columns to the units declared in ``unit_mapping``.
+
+    ``report`` maps question_id to a Counter of units that could not be
+    converted, weighted by the number of affected values.
+    """
+
+    def __init__(self, unit_mapping, registry=None):
+        self.registry = registry or UnitRegistry()
+        self.target_units = {question_id: unit for question_id, unit in unit_mapping.items() if unit}
+        self.report = {}
+        # Compile every target unit up front; a target the registry does not
+        # know is reported once and its answers are passed through untouched.
+        self.unknown_targets = {}
+        for question_id, unit in self.target_units.items():
+            try:
+                self.registry.parse(unit)
+            except UnitConversionError as exc:
+                self.unknown_targets[question_id] = str(exc)
+
+    def _reject(self, question_id, unit, count):
+        self.report.setdefault(question_id, Counter())[unit] += int(count)
+
+    def convert_column(self, question_id, values, units):
+        """Return ``values`` converted to the question's unit.
+
+        ``units`` is either one unit for the whole column or a sequence of
+        per-value units; empty or None entries mean the answer is already in
+        the target unit.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        target = self.target_units.get(question_id)
+        if target is None or question_id in self.unknown_targets:
+            return values.copy()
+        if units is None or isinstance(units, str):
+            try:
+                return values * self.registry.factor(units or target, target)
+            except UnitConversionError:
+                self._reject(question_id, units, np.count_nonzero(~np.isnan(values)))
+                return np.full_like(values, np.nan)
+
+        units = np.asarray(units)
+        if units.dtype == object:
+            units = np.array(["" if unit is None else unit for unit in units], dtype=str)
+        names, inverse = np.unique(units, return_inverse=True)
+        factors = np.empty(len(names))
+        for k, name in enumerate(names.tolist()):
+            name = name or target
+            try:
+                factors[k] = self.registry.factor(name, target)
+            except UnitConversionError:
+                factors[k] = np.nan
+                self._reject(question_id, name, np.count_nonzero((inverse == k) & ~np.isnan(values)))
+        return values * factors[inverse]
+
+    def normalize(self, columns, units_by_question):
+        """Convert ``ResponseColumns`` in place.
+
+        ``units_by_question`` maps question_id to the unit(s) the answers were
+        entered in. Values that could not be converted are masked as missing.
+        Returns ``self.report``.
+        """
+        for question_id, units in units_by_question.items():
+            if question_id not in columns.question_ids:
+                continue
+            j = columns.question_ids.index(question_id)
+            columns.values[:, j] = self.convert_column(question_id, columns.values[:, j], units)
+            columns.present[:, j] = ~np.isnan(columns.values[:, j])
+        return self.report
@@ -0,0 +1,194 @@
+"""Parallel, cached builds of questionnaire variants.
+
+A variant matrix is a JSON file such as::
+
+    {
+      "source": "questions.{language}.jsonl",
+      "matrix": {
+        "language": ["en", "de"],
+        "sector": [null, "Manufacturing", "Retail"],
+        "guidance": [false, true]
+      },
+      "variants": [{"name": "pilot", "sector": "Food", "format": "ndjson"}]
+    }
+
+Every combination in ``matrix`` plus every entry of ``variants`` is one
+variant. ``source`` is optional (the built-in ``flat_questions`` are used when
+absent) and may use any parameter as a placeholder; a variant that sets
+``language`` must have a ``source`` with a ``{language}`` placeholder, since
+nothing else would differ between languages. Question rows may carry a
+``sectors`` list restricting them to those sectors; rows without one are part
+of every variant. ``guidance`` keeps ``calculation_method`` and ``example``.
+``format`` is one of ``FORMAT_SUFFIXES``.
+Variants without a ``name`` are named from their language, sector and
+guidance, followed by the format and source when those differ from the
+defaults (e.g. ``de-retail-plain-ndjson``).
+
+Each variant is content-hashed from its question rows, their units, its
+parameters and ``BUILD_VERSION``. Variants whose hash matches the cache
+manifest in the output directory are skipped; the rest are built in a process
+pool.
+"""
+import hashlib
+import itertools
+import json
+import os
+import re
+import string
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from questionnaire_stream import iter_sections, open_output, read_questions, write_sections
+
+# Bump when the output produced for unchanged inputs changes.
+BUILD_VERSION = "1"
+
+CACHE_MANIFEST = ".variants-cache.json"
+PARAMETERS = ("language", "sector", "guidance", "format", "source")
+FORMAT_SUFFIXES = {"json": ".json", "ndjson": ".ndjson"}
+
+
+def _slug(value):
+    return re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-")
+
+
+def _placeholders(template):
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+
+def expand_matrix(spec):
+    """Return the list of variant parameter dicts described by a matrix spec.
+
+    Raises ValueError for an unknown format, a ``language`` that the source
+    does not depend on, an unknown source placeholder or duplicate names.
+    """
+    defaults = {key: spec[key] for key in PARAMETERS if key in spec}
+    variants = []
+    matrix = spec.get("matrix") or {}
+    if matrix:
+        keys = list(matrix)
+        for values in itertools.product(*(matrix[key] for key in keys)):
+            variants.append(dict(defaults, **dict(zip(keys, values))))
+    for variant in spec.get("variants") or ():
+        variants.append(dict(defaults, **variant))
+    for variant in variants:
+        variant.setdefault("guidance", False)
+        variant.setdefault("format", "json")
+        source = variant.get("source")
+        label = variant.get("name") or json.dumps(variant, sort_keys=True)
+        if variant["format"] not in FORMAT_SUFFIXES:
+            raise ValueError(f"Unknown format {variant['format']!r} in variant {label}: "
+                             f"expected one of {', '.join(FORMAT_SUFFIXES)}")
+        if variant.get("language") and "language" not in _placeholders(source or ""):
+            where = f"its source {source!r} has" if source else "it has no source with"
+            raise ValueError(f"Variant {label} sets language {variant['language']!r} but {where} "
+                             f"no {{language}} placeholder")
+        if source:
+            try:
+                variant["source"] = source.format(**variant)
+            except KeyError as exc:
+                raise ValueError(f"Unknown placeholder {exc} in source {source!r}") from None
+        if not variant.get("name"):
+            parts = [
+                _slug(variant.get("language") or "default"),
+                _slug(variant.get("sector") or "all"),
+                "guidance" if variant["guidance"] else "plain",
+            ]
+            # Parameters that differ from the defaults must show up in the
+            # name too, or two variants would share a name and a cache entry.
+            if variant["format"] != "json":
+                parts.append(_slug(variant["format"]))
+            if source and source != defaults.get("source"):
+                parts.append(_slug(variant["source"]))
+            variant["name"] = "-".join(parts)
+    counts = Counter(variant["name"] for variant in variants)
+    duplicates = sorted(name for name, count in counts.items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Duplicate variant names: {', '.join(duplicates)}")
+    return variants
+
+
+def _row_digests(rows, unit_mapping):
+    # One digest per row, computed once per source and shared by every variant.
+    digests = []
+    for row in rows:
+        canonical = json.dumps([row, unit_mapping.get(row["question_id"])], sort_keys=True, ensure_ascii=False)
+        digests.append(hashlib.sha256(canonical.encode("utf-8")).digest())
+    return digests
+
+
+def _selected(rows, sector):
+    # Indices of the rows that belong to a sector's variant.
+    return [i for i, row in enumerate(rows)
+            if not row.get("sectors") or (sector is not None and sector in row["sectors"])]
+
+
+def variant_hash(digests, selected, params):
+    """Content hash of a variant from its row digests and parameters."""
+    h = hashlib.sha256(BUILD_VERSION.encode("ascii"))
+    h.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for i in selected:
+        h.update(digests[i])
+    return h.hexdigest()
+
+
+def _build_one(job):
+    rows, unit_mapping, params, path = job
+    tmp_path = path + ".tmp"
+    with open_output(tmp_path) as fh:
+        write_sections(iter_sections(rows, unit_mapping, params["guidance"]), fh, params["format"])
+    os.replace(tmp_path, path)
+    return params["name"]
+
+
+def _load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_variants(spec, questions, unit_mapping, out_dir, workers=None, force=False):
+    """Build every variant of ``spec`` into ``out_dir``.
+
+    ``questions`` are the rows used by variants without a ``source``.
+    Returns ``{"built": [...], "skipped": [...], "warnings": [...]}``: lists
+    of variant names, and messages for variants whose sector matched no
+    sector-specific rows (they are built with the common rows only).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, CACHE_MANIFEST)
+    manifest = _load_manifest(manifest_path)
+    sources = {}
+    jobs, hashes, skipped, warnings = [], {}, [], []
+    for params in expand_matrix(spec):
+        source = params.get("source")
+        if source not in sources:
+            rows = list(read_questions(source)) if source else list(questions)
+            sources[source] = (rows, _row_digests(rows, unit_mapping), len(_selected(rows, None)))
+        rows, digests, common = sources[source]
+        selected = _selected(rows, params.get("sector"))
+        if params.get("sector") is not None and len(selected) == common:
+            warnings.append(f"variant {params['name']}: sector {params['sector']!r} selects no "
+                            f"sector-specific rows of {source or 'the built-in questions'}")
+        digest = variant_hash(digests, selected, params)
+        path = os.path.join(out_dir, params["name"] + FORMAT_SUFFIXES[params["format"]])
+        if not force and manifest.get(params["name"]) == digest and os.path.exists(path):
+            skipped.append(params["name"])
+            continue
+        hashes[params["name"]] = digest
+        jobs.append(([rows[i] for i in selected], unit_mapping, params, path))
+
+    built = []
+    if jobs:
+        if workers == 1 or len(jobs) == 1:
+            built = [_build_one(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                built = list(pool.map(_build_one, jobs))
+        manifest.update(hashes)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+        os.replace(manifest_path + ".tmp", manifest_path)
+    return {"built": built, "skipped": skipped, "warnings": warnings}